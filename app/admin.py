@@ -24,7 +24,7 @@ class BlockchainAdmin(admin.ModelAdmin):
 
 @admin.register(CheckInstance)
 class CheckInstanceAdmin(admin.ModelAdmin):
-    list_display = ('run_id', 'type', 'started', 'duration')
+    list_display = ('run_id', 'type', 'started', 'duration', 'timed_out')
 
     def duration(self, obj):
         if obj.completed is not None:
@@ -47,8 +47,7 @@ class ChainHeightResultAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related(
-            'blockchain', 'blockchain__service', 'blockchain__meta',
-            'best_result__blockchain', 'best_result__blockchain__service'
+            'blockchain', 'blockchain__service', 'blockchain__meta'
         )
 
     def run_number(self, obj):
@@ -77,7 +76,8 @@ class PingResultAdmin(admin.ModelAdmin):
 @admin.register(CheckError)
 class CheckErrorAdmin(admin.ModelAdmin):
     list_display = (
-        'created', 'blockchain_slug', 'service_slug', 'error_message_truncated'
+        'created', 'last_seen', 'occurrences', 'blockchain_slug', 'service_slug',
+        'error_message_truncated'
     )
     ordering = ('-pk',)
     readonly_fields = ('check_instance', 'blockchain')
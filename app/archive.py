@@ -0,0 +1,169 @@
+"""
+Keeps expired results on disk before they are pruned.
+
+When ARCHIVE_DIR is set, pruning first streams the rows that are about to expire into
+gzip compressed CSV files, one directory per model and day:
+
+    ARCHIVE_DIR/manifest.json
+    ARCHIVE_DIR/app.ChainHeightResult/2021-02-01/part-20210211T000000.csv.gz
+
+The manifest lists every file with its row count and remembers up to when each model has
+been archived, so every run only exports the rows that expired since the last one.
+`read_archive` streams rows of a time range back without loading whole files.
+"""
+import os
+import csv
+import gzip
+import json
+import datetime
+import logging
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ChainHeightResult, PingResult, BlockValidationResult, \
+    ChainHeightHourlyRollup, PingMinutelyRollup, ErrorHourlyRollup
+
+logger = logging.getLogger(__name__)
+
+# (model, time column) of everything that is archived
+ARCHIVED_MODELS = (
+    (ChainHeightResult, 'started'),
+    (PingResult, 'started'),
+    (BlockValidationResult, 'started'),
+    (ChainHeightHourlyRollup, 'hour'),
+    (PingMinutelyRollup, 'minute'),
+    (ErrorHourlyRollup, 'hour'),
+)
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def is_enabled():
+    return bool(settings.ARCHIVE_DIR)
+
+
+def load_manifest():
+    path = os.path.join(settings.ARCHIVE_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'version': 1, 'models': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    path = os.path.join(settings.ARCHIVE_DIR, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def archive_model(model, time_column, before):
+    """
+    Export the rows of a model older than the given time that have not been archived yet,
+    returns the number of rows written
+    """
+    manifest = load_manifest()
+    label = model._meta.label
+    entry = manifest['models'].setdefault(label, {
+        'time_column': time_column,
+        'archived_until': None,
+        'files': []
+    })
+    columns = _columns(model)
+    queryset = model.objects.filter(**{f'{time_column}__lt': before})
+    if entry['archived_until'] is not None:
+        since = parse_datetime(entry['archived_until'])
+        if since >= before:
+            return 0
+        queryset = queryset.filter(**{f'{time_column}__gte': since})
+
+    run = timezone.now().strftime('%Y%m%dT%H%M%S')
+    time_index = columns.index(time_column)
+    open_files = {}
+    rows = 0
+    try:
+        # server-side cursor, rows are written out as they arrive
+        for row in queryset.order_by('pk').values_list(*columns).iterator(chunk_size=2000):
+            day = row[time_index].astimezone(datetime.timezone.utc).date().isoformat()
+            if day not in open_files:
+                path = os.path.join(label, day, f'part-{run}.csv.gz')
+                os.makedirs(os.path.join(settings.ARCHIVE_DIR, label, day), exist_ok=True)
+                f = gzip.open(os.path.join(settings.ARCHIVE_DIR, path + '.tmp'), 'wt', newline='')
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                open_files[day] = [path, f, writer, 0]
+            file_entry = open_files[day]
+            file_entry[2].writerow([_csv_value(value) for value in row])
+            file_entry[3] += 1
+            rows += 1
+    finally:
+        for path, f, _, _ in open_files.values():
+            f.close()
+
+    for day, (path, _, _, count) in sorted(open_files.items()):
+        full_path = os.path.join(settings.ARCHIVE_DIR, path)
+        os.replace(full_path + '.tmp', full_path)
+        entry['files'].append({'day': day, 'path': path, 'rows': count, 'columns': columns})
+    entry['archived_until'] = before.isoformat()
+    save_manifest(manifest)
+    logger.info(f'archived {rows} rows of {label} from before {before}')
+    return rows
+
+
+def archive_expired(model, before):
+    """
+    Archive the model's rows older than the given time, if the model is archived at all
+    """
+    if not is_enabled():
+        return 0
+    for archived_model, time_column in ARCHIVED_MODELS:
+        if archived_model is model:
+            os.makedirs(settings.ARCHIVE_DIR, exist_ok=True)
+            return archive_model(model, time_column, before)
+    return 0
+
+
+def read_archive(model, start, end):
+    """
+    Stream the archived rows of a model between two times as dicts, reading one file and
+    one row at a time
+    """
+    entry = load_manifest()['models'].get(model._meta.label)
+    if entry is None:
+        return
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    time_column = entry['time_column']
+    first_day, last_day = (
+        t.astimezone(datetime.timezone.utc).date().isoformat() for t in (start, end)
+    )
+    for file_entry in sorted(entry['files'], key=lambda e: (e['day'], e['path'])):
+        if not first_day <= file_entry['day'] <= last_day:
+            continue
+        with gzip.open(os.path.join(settings.ARCHIVE_DIR, file_entry['path']), 'rt', newline='') as f:
+            for raw in csv.DictReader(f):
+                row = {}
+                for column, value in raw.items():
+                    field = fields.get(column)
+                    if field is None:
+                        continue
+                    if value == '' and field.null:
+                        row[column] = None
+                    else:
+                        row[column] = field.to_python(value)
+                if start <= row[time_column] < end:
+                    yield row
@@ -1,3 +1,4 @@
+import time
 from uuid import uuid4
 import requests
 from requests.adapters import HTTPAdapter
@@ -25,8 +26,26 @@ class TimeoutHTTPAdapter(HTTPAdapter):
 
 
 class HttpBase:
+    # hosts this runner talks to, connected to when a worker starts so the first check
+    # after a deploy does not pay for DNS, TCP and TLS setup
+    warm_up_urls = []
+
     def __init__(self):
         self.session = requests.session()
         adapter = TimeoutHTTPAdapter()
         self.session.mount('https://', adapter)
         self.session.mount('http://', adapter)
+
+    def warm_up(self, deadline):
+        """
+        Connect to every host, giving up on the remaining ones at the (monotonic) deadline
+        """
+        for url in self.warm_up_urls:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                self.session.head(url, allow_redirects=False,
+                                  timeout=min(settings.HTTP_TIMEOUT, remaining))
+            except requests.RequestException:
+                pass  # any problem with the host is reported by the checks themselves
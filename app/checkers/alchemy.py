@@ -5,6 +5,8 @@ from ._utils import HttpBase
 
 
 class AlchemyCheckRunner(CheckRunner, HttpBase):
+    warm_up_urls = ['https://eth-mainnet.alchemyapi.io', 'https://eth-ropsten.alchemyapi.io']
+
     def __init__(self):
         super().__init__()
         self.mainnet_key = settings.ALCHEMY_MAINNET_KEY
@@ -13,6 +13,7 @@ class AmberdataCheckRunner(CheckRunner, HttpBase):
         'litecoin-mainnet': ('Litecoin Mainnet', 'litecoin-mainnet', False),
         'zcash-mainnet': ('Zcash Mainnet', 'zcash-mainnet', False)
     }
+    warm_up_urls = ['https://web3api.io']
 
     def __init__(self):
         self.token = settings.AMBERDATA_TOKEN
@@ -4,6 +4,8 @@ from ._utils import HttpBase
 
 
 class BlockchainCheckRunner(CheckRunner, HttpBase):
+    warm_up_urls = ['https://blockchain.info']
+
     def get_supported_chains(self) -> List[Blockchain]:
         return [
             Blockchain(name='Bitcoin Mainnet', slug='bitcoin-mainnet', testnet=False)
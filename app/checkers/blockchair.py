@@ -22,6 +22,7 @@ class BlockChairCheckRunner(CheckRunner, HttpBase):
         'tezos-mainnet': ('Tezos Mainnet', 'tezos', False),
         'eos-mainnet': ('EOS Mainnet', 'eos', False),
     }
+    warm_up_urls = ['https://api.blockchair.com']
 
     def __init__(self):
         self.token = settings.BLOCKCHAIR_TOKEN
@@ -13,6 +13,7 @@ class BlockCypherCheckRunner(CheckRunner, HttpBase):
         'litecoin-mainnet': ('Litecoin Mainnet', 'ltc/main', False),
         'ethereum-mainnet': ('Ethereum Mainnet', 'eth/main', False)
     }
+    warm_up_urls = ['https://api.blockcypher.com']
 
     def __init__(self):
         self.token = settings.BLOCKCYPHER_TOKEN
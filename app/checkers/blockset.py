@@ -16,6 +16,7 @@ class BlocksetCheckRunner(CheckRunner, HttpBase):
         self.endpoint = endpoint
         self.verify = verify
         self.additional_headers = additional_headers()
+        self.warm_up_urls = [endpoint]
         super().__init__()
 
     def get_supported_chains(self) -> List[Blockchain]:
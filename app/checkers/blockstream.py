@@ -5,6 +5,8 @@ from ._utils import HttpBase
 
 
 class BlockstreamCheckRunner(CheckRunner, HttpBase):
+    warm_up_urls = ['https://blockstream.info']
+
     def __init__(self):
         super().__init__()
 
@@ -6,6 +6,8 @@ from ._utils import HttpBase
 
 
 class EtherscanCheckRunner(CheckRunner, HttpBase):
+    warm_up_urls = ['https://api.etherscan.io', 'https://api-ropsten.etherscan.io']
+
     def __init__(self):
         self.token = settings.ETHERSCAN_TOKEN
         super().__init__()
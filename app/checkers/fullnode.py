@@ -47,6 +47,9 @@ class FullNodeRunner(CheckRunner, HttpBase):
         self.ethereums = {
             'ethereum-mainnet', 'ethereum-ropsten'
         }
+        self.warm_up_urls = list(self.endpoint_map.values()) + [
+            'https://trest.bitcoin.com', 'https://api.whatsonchain.com'
+        ]
         super().__init__()
 
     def get_supported_chains(self) -> List[Blockchain]:
@@ -5,6 +5,8 @@ from ._utils import HttpBase
 
 
 class InfuraCheckRunner(CheckRunner, HttpBase):
+    warm_up_urls = ['https://mainnet.infura.io', 'https://ropsten.infura.io']
+
     def __init__(self):
         self.project_id = settings.INFURA_PROJECT_ID
         super().__init__()
@@ -5,6 +5,8 @@ from ._utils import HttpBase
 
 
 class XrplCheckRunner(CheckRunner, HttpBase):
+    warm_up_urls = ['https://data.ripple.com']
+
     def __init__(self):
         super().__init__()
 
@@ -0,0 +1,104 @@
+"""
+Announces completed rounds to the live event stream (see app.sse).
+
+Every event gets an increasing id and is published on a redis channel, the latest
+SSE_HISTORY_LENGTH events are also kept in a list so a client that reconnects with
+Last-Event-ID receives what it missed. Events only carry public services and are kept
+compact, clients fetch the pages they show when they need more.
+"""
+import json
+import logging
+from redis import RedisError
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from ._utils import get_redis
+from .models import LatestChainStatus, PingResult
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'chain-heights:events'
+HISTORY_KEY = 'chain-heights:events-history'
+ID_KEY = 'chain-heights:events-id'
+
+EVENT_HEIGHT = 'height'
+EVENT_PING = 'ping'
+EVENT_VALIDATION = 'validation'
+
+
+def publish(event, data):
+    """
+    Send an event to every connected client, returns its id
+    """
+    def push(pipe):
+        # the id is taken and the event sent in one transaction, so events are
+        # published and kept in the order of their ids
+        event_id = int(pipe.get(ID_KEY) or 0) + 1
+        message = json.dumps({'id': event_id, 'event': event, 'data': data}, cls=DjangoJSONEncoder)
+        pipe.multi()
+        pipe.set(ID_KEY, event_id)
+        pipe.lpush(HISTORY_KEY, message)
+        pipe.ltrim(HISTORY_KEY, 0, settings.SSE_HISTORY_LENGTH - 1)
+        pipe.publish(CHANNEL, message)
+        return event_id
+
+    try:
+        return get_redis().transaction(push, ID_KEY, value_from_callable=True)
+    except RedisError:
+        logger.warning(f'unable to publish {event} event', exc_info=True)
+        return None
+
+
+def get_history(after_id):
+    """
+    The kept events newer than the given id, oldest first
+    """
+    messages = [json.loads(m) for m in get_redis().lrange(HISTORY_KEY, 0, -1)]
+    return [m for m in reversed(messages) if m['id'] > after_id]
+
+
+def publish_height_check(check_id):
+    """
+    [height, lag, lag status, status] of every public chain by chain and service
+    """
+    statuses = LatestChainStatus.objects.public().filter(check_instance_id=check_id)
+    chains = {}
+    completed = None
+    for status in statuses:
+        completed = status.check_completed
+        chains.setdefault(status.chain_slug, {})[status.service_slug] = [
+            status.height, status.lag, status.lag_status, status.status
+        ]
+    if not chains:
+        # a newer check already replaced the statuses, nothing to announce
+        return None
+    return publish(EVENT_HEIGHT, {'check_id': check_id, 'completed': completed, 'chains': chains})
+
+
+def publish_ping_check(check):
+    """
+    [status, duration] of every public service
+    """
+    pings = PingResult.objects.filter(
+        check_instance=check, service__private=False
+    ).values_list('service__slug', 'status', 'duration')
+    return publish(EVENT_PING, {
+        'check_id': check.pk,
+        'completed': check.completed,
+        'services': {slug: [status, duration] for slug, status, duration in pings}
+    })
+
+
+def publish_validation(instance):
+    chain = instance.blockchain
+    if chain.service.private:
+        return None
+    return publish(EVENT_VALIDATION, {
+        'validation_id': instance.pk,
+        'service': chain.service.slug,
+        'chain': chain.slug,
+        'start_height': instance.start_height,
+        'end_height': instance.end_height,
+        'completed': instance.completed,
+        'timed_out': instance.timed_out
+    })
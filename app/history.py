@@ -0,0 +1,176 @@
+"""
+Paged history of height, ping and block validation results for the history API.
+
+Results come newest first and are paged with a cursor holding the (started, id) of the
+last row of the previous page rather than an offset, every page is a row comparison on
+the (started, id) indexes and costs the same however deep it is. Only public services
+are included. Rows are serialized to a fixed set of short fields:
+
+    heights:     id, started, service, chain, status, height, best_height, lag, duration, error
+    pings:       id, started, service, status, duration
+    validations: id, started, service, chain, status, height, block_hash, canonical,
+                 hash_mismatch, missing_transactions, duration
+"""
+import base64
+import datetime
+from django.conf import settings
+from django.db.models import Func, IntegerField
+from django.utils.dateparse import parse_datetime
+
+from .models import ChainHeightResult, PingResult, BlockValidationResult, RESULT_STATUSES
+from .registry import get_registry
+
+
+class HistoryError(ValueError):
+    pass
+
+
+class Cardinality(Func):
+    function = 'cardinality'
+    output_field = IntegerField()
+
+
+class History:
+    """
+    One kind of result: the model, whether its rows belong to a chain or directly to a
+    service and the serialized fields as (name, queryset value)
+    """
+    def __init__(self, model, by_chain, fields, annotations=None):
+        self.model = model
+        self.by_chain = by_chain
+        self.fields = fields
+        self.annotations = annotations or {}
+
+    def serialize(self, row, registry, services_by_pk):
+        item = dict(zip((name for name, _ in self.fields), row))
+        if self.by_chain:
+            chain = registry.get_chain_by_pk(item.pop('chain'))
+            item['service'] = chain.service.slug
+            item['chain'] = chain.slug
+        else:
+            item['service'] = services_by_pk[item['service']].slug
+        return item
+
+
+HISTORIES = {
+    'heights': History(ChainHeightResult, True, (
+        ('id', 'id'), ('started', 'started'), ('chain', 'blockchain_id'), ('status', 'status'),
+        ('height', 'height'), ('best_height', 'best_height'), ('lag', 'lag'),
+        ('duration', 'duration'), ('error', 'error'),
+    )),
+    'pings': History(PingResult, False, (
+        ('id', 'id'), ('started', 'started'), ('service', 'service_id'), ('status', 'status'),
+        ('duration', 'duration'),
+    )),
+    'validations': History(BlockValidationResult, True, (
+        ('id', 'id'), ('started', 'started'), ('chain', 'blockchain_id'), ('status', 'status'),
+        ('height', 'height'), ('block_hash', 'block_hash'), ('canonical', 'is_canonical'),
+        ('hash_mismatch', 'hash_mismatch'), ('missing_transactions', 'missing_transactions'),
+        ('duration', 'duration'),
+    ), {'missing_transactions': Cardinality('missing_transaction_ids')}),
+}
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def encode_cursor(started, pk):
+    micros = (started - EPOCH) // datetime.timedelta(microseconds=1)
+    return base64.urlsafe_b64encode(f'{micros}.{pk}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        micros, pk = raw.split('.')
+        return EPOCH + datetime.timedelta(microseconds=int(micros)), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise HistoryError(f'invalid cursor {cursor}')
+
+
+def _parse_time(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None or parsed.tzinfo is None:
+        raise HistoryError(f'{name} must be an ISO 8601 time with a timezone')
+    return parsed
+
+
+def get_page(kind, params):
+    """
+    One page of results for the query parameters (service, chain, since, until, status,
+    limit, cursor), returns the serialized rows and the cursor of the next page
+    """
+    history = HISTORIES[kind]
+    registry = get_registry()
+    queryset = history.model.objects.all()
+
+    service_slug = params.get('service')
+    chain_slug = params.get('chain')
+    services = registry.get_services()
+    if history.by_chain:
+        chains = [
+            chain for chain in registry.chains_by_pk.values()
+            if (not service_slug or chain.service.slug == service_slug)
+            and (not chain_slug or chain.slug == chain_slug)
+        ]
+        if service_slug or chain_slug:
+            queryset = queryset.filter(
+                blockchain_id__in=[chain.pk for chain in chains if not chain.service.private]
+            )
+        else:
+            queryset = queryset.exclude(
+                blockchain_id__in=[chain.pk for chain in chains if chain.service.private]
+            )
+    elif chain_slug:
+        raise HistoryError(f'{kind} can not be filtered by chain')
+    elif service_slug:
+        queryset = queryset.filter(
+            service_id__in=[s.pk for s in services if s.slug == service_slug and not s.private]
+        )
+    else:
+        queryset = queryset.exclude(service_id__in=[s.pk for s in services if s.private])
+
+    since = _parse_time(params, 'since')
+    if since is not None:
+        queryset = queryset.filter(started__gte=since)
+    until = _parse_time(params, 'until')
+    if until is not None:
+        queryset = queryset.filter(started__lt=until)
+    statuses = [s for s in params.get('status', '').split(',') if s]
+    if statuses:
+        known = {status for status, _ in RESULT_STATUSES}
+        if not known.issuperset(statuses):
+            raise HistoryError(f'status must be one or more of {", ".join(sorted(known))}')
+        queryset = queryset.filter(status__in=statuses)
+
+    try:
+        limit = int(params.get('limit', settings.HISTORY_PAGE_SIZE))
+    except ValueError:
+        raise HistoryError('limit must be a number')
+    limit = max(1, min(limit, settings.HISTORY_MAX_PAGE_SIZE))
+
+    cursor = params.get('cursor')
+    if cursor:
+        started, pk = decode_cursor(cursor)
+        table = history.model._meta.db_table
+        # a row comparison, which postgres answers straight from the (started, id) index
+        queryset = queryset.extra(where=[f'({table}.started, {table}.id) < (%s, %s)'],
+                                  params=[started, pk])
+
+    rows = list(
+        queryset.annotate(**history.annotations).order_by('-started', '-id').values_list(
+            *(value for _, value in history.fields)
+        )[:limit + 1]
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+    services_by_pk = {service.pk: service for service in services}
+    return [history.serialize(row, registry, services_by_pk) for row in rows], next_cursor
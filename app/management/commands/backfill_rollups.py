@@ -0,0 +1,23 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.models import ChainHeightHourlyRollup, PingMinutelyRollup, ErrorHourlyRollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute the hourly rollups from the raw results that are still stored'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=10,
+                            help='How many days of history to recompute')
+
+    def handle(self, *args, **options):
+        since = (timezone.now() - timedelta(days=options['days'])).replace(
+            minute=0, second=0, microsecond=0)
+        rows = ChainHeightHourlyRollup.objects.rebuild(since)
+        self.stdout.write(f'recomputed {rows} chain height hours since {since}')
+        rows = PingMinutelyRollup.objects.rebuild(since)
+        self.stdout.write(f'recomputed {rows} ping minutes since {since}')
+        rows = ErrorHourlyRollup.objects.rebuild(since)
+        self.stdout.write(f'recomputed {rows} error hours since {since}')
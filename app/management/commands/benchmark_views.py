@@ -0,0 +1,103 @@
+import os
+import time
+import threading
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+
+def get_rss(pid):
+    """
+    Resident memory of a process and all of its children in bytes (linux only)
+    """
+    total = 0
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                total += int(line.split()[1]) * 1024
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            children = f.read().split()
+    except FileNotFoundError:
+        children = []
+    for child in children:
+        try:
+            total += get_rss(child)
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Load a running server with concurrent requests and report requests per second, '
+        'latencies and (with --pid) the memory of the server processes. To compare the '
+        'deployments start the WSGI (Procfile web) and the ASGI (Procfile asgi) server with '
+        'worker counts that use the same memory, then run this against each of them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000',
+                            help='Base url of the server')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request, may be repeated (default: the read endpoints)')
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Number of clients requesting at the same time')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Seconds to run for, per path')
+        parser.add_argument('--pid', type=int, action='append', dest='pids', default=[],
+                            help='Server process (with its workers) to measure, may be repeated')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/', '/difftable/', '/validtable/', '/json_summary/']
+        for pid in options['pids']:
+            if not os.path.exists(f'/proc/{pid}/status'):
+                raise CommandError(f'no process {pid} (memory is read from /proc)')
+        for path in paths:
+            self.run(options['url'].rstrip('/') + path, options)
+
+    def run(self, url, options):
+        latencies = []
+        errors = []
+        peak_rss = 0
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def client():
+            session = requests.Session()
+            while time.monotonic() < deadline:
+                started = time.monotonic()
+                try:
+                    response = session.get(url, timeout=30)
+                    failed = response.status_code >= 500
+                except requests.RequestException:
+                    failed = True
+                elapsed = time.monotonic() - started
+                with lock:
+                    (errors if failed else latencies).append(elapsed)
+
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(options['concurrency'])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            if options['pids']:
+                peak_rss = max(peak_rss, sum(get_rss(pid) for pid in options['pids']))
+            time.sleep(0.5)
+        elapsed = time.monotonic() - started
+
+        latencies.sort()
+        line = (
+            f'{url}: {len(latencies) / elapsed:.1f} req/s, {len(latencies)} ok, {len(errors)} failed, '
+            f'p50 {percentile(latencies, 0.5) * 1000:.0f}ms, '
+            f'p95 {percentile(latencies, 0.95) * 1000:.0f}ms, '
+            f'p99 {percentile(latencies, 0.99) * 1000:.0f}ms'
+        )
+        if options['pids']:
+            line += f', peak rss {peak_rss / 2 ** 20:.0f}MB'
+        self.stdout.write(line)
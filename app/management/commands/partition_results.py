@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app import partitions, pruning
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming daily partitions of the result tables and drop expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help='Convert result tables that are not partitioned yet, '
+                                 'locks each table while it is being converted')
+        parser.add_argument('--ahead', type=int, default=settings.RESULT_PARTITIONS_AHEAD,
+                            help='How many days of partitions to create ahead of time')
+        parser.add_argument('--drop-expired', action='store_true',
+                            help='Drop partitions older than the retention of their table')
+
+    def handle(self, *args, **options):
+        for model, key in partitions.PARTITIONED_MODELS:
+            table = model._meta.db_table
+            if not partitions.is_partitioned(model):
+                if not options['convert']:
+                    self.stdout.write(f'{table} is not partitioned, skipping (see --convert)')
+                    continue
+                partitions.convert(model, key)
+                self.stdout.write(f'converted {table} into daily partitions by {key}')
+            created = partitions.create_ahead(model, options['ahead'])
+            self.stdout.write(f'{table}: {len(created)} partitions up to {options["ahead"]} days ahead')
+            if options['drop_expired']:
+                before = timezone.now() - pruning.get_retention(model)
+                for name in partitions.drop_expired(model, before):
+                    self.stdout.write(f'dropped {name}')
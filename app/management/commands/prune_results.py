@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app import pruning
+
+
+class Command(BaseCommand):
+    help = 'Delete expired checks and results in batches, safe to interrupt and run again'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.PRUNE_BATCH_SIZE,
+                            help='How many rows to delete per transaction')
+        parser.add_argument('--pause', type=float, default=settings.PRUNE_BATCH_PAUSE,
+                            help='Seconds to wait between batches')
+
+    def handle(self, *args, **options):
+        def progress(label, deleted):
+            self.stdout.write(f'{label}: {deleted} rows deleted')
+
+        pruning.archive_unpruned()
+        for policy in pruning.PRUNE_POLICIES:
+            deleted = pruning.prune_model(policy, options['batch_size'], options['pause'], progress)
+            self.stdout.write(f'pruned {deleted} rows of {policy.model._meta.label} '
+                              f'older than {pruning.get_retention(policy.model).days} days')
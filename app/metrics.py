@@ -0,0 +1,209 @@
+"""
+Prometheus metrics of the checks, served at /metrics.
+
+A scrape never touches the database. Completing a height check, a ping check or a block
+validation folds its outcome into a snapshot in redis and the endpoint only renders that
+snapshot in the text exposition format. Only public services are included.
+
+    chain_heights_height, _lag, _up                 gauges per service and chain, from the
+                                                    latest height check
+    chain_heights_check_duration_seconds            histogram of height requests per service,
+                                                    without the round deadline timeouts
+    chain_heights_ping_duration_seconds             histogram of pings per service, likewise
+    chain_heights_check_errors_total                counter of failed results per type,
+                                                    service and error tag
+    chain_heights_round_duration_seconds            histogram of rounds per type
+    chain_heights_round_completed_timestamp_seconds gauge per type
+    chain_heights_validation_duration_seconds       histogram of validation windows per
+                                                    service and chain
+"""
+import logging
+from collections import defaultdict
+from redis import RedisError
+from django.conf import settings
+
+from ._utils import get_redis
+from .models import ChainHeightResult, PingResult, CheckInstance, RESULT_STATUS_OK, \
+    ROUND_TIMEOUT_ERROR
+
+logger = logging.getLogger(__name__)
+
+# counters, histograms and the round gauges
+METRICS_KEY = 'chain-heights:metrics'
+# gauges of the latest height check, replaced as a whole by every check
+CHAINS_KEY = 'chain-heights:metrics:chains'
+
+# name: (type, help), in the order they are exposed
+METRICS = {
+    'chain_heights_height': ('gauge', 'Height reported in the latest height check'),
+    'chain_heights_lag': ('gauge', 'Blocks behind the best height of the latest height check'),
+    'chain_heights_up': ('gauge', 'Whether the latest height check of the chain succeeded'),
+    'chain_heights_check_duration_seconds': ('histogram', 'Duration of height requests'),
+    'chain_heights_ping_duration_seconds': ('histogram', 'Duration of pings'),
+    'chain_heights_check_errors_total': ('counter', 'Failed height and ping results by error tag'),
+    'chain_heights_round_duration_seconds': ('histogram', 'Time from starting to completing a round'),
+    'chain_heights_round_completed_timestamp_seconds': ('gauge', 'When the latest round completed'),
+    'chain_heights_validation_duration_seconds': (
+        'histogram', 'Time from starting to completing a block validation window'
+    ),
+}
+
+HISTOGRAM_SUFFIXES = ('_bucket', '_sum', '_count')
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def sample(name, **labels):
+    """
+    A sample name with its labels, e.g. chain_heights_up{service="blockset",chain="btc"}
+    """
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def observe(increments, name, value, buckets, **labels):
+    """
+    Add an observation of a histogram to the increments, every bucket is incremented
+    (by 0 when above it) so all of them are exposed from the first observation on
+    """
+    for bound in buckets:
+        increments[sample(f'{name}_bucket', **labels, le=bound)] += int(value <= bound)
+    increments[sample(f'{name}_bucket', **labels, le='+Inf')] += 1
+    increments[sample(f'{name}_sum', **labels)] += value
+    increments[sample(f'{name}_count', **labels)] += 1
+
+
+def _round(increments, gauges, check, round_type):
+    observe(increments, 'chain_heights_round_duration_seconds',
+            (check.completed - check.started).total_seconds(),
+            settings.METRICS_ROUND_BUCKETS, type=round_type)
+    gauges[sample('chain_heights_round_completed_timestamp_seconds', type=round_type)] = \
+        check.completed.timestamp()
+
+
+def _apply(increments, gauges=None, chains=None):
+    with get_redis().pipeline() as pipe:
+        for field, amount in increments.items():
+            pipe.hincrbyfloat(METRICS_KEY, field, amount)
+        if gauges:
+            pipe.hset(METRICS_KEY, mapping=gauges)
+        if chains is not None:
+            pipe.delete(CHAINS_KEY)
+            if chains:
+                pipe.hset(CHAINS_KEY, mapping=chains)
+        pipe.execute()
+
+
+def record_height_check(check_id):
+    """
+    Replace the chain gauges with the results of a completed height check and count its
+    durations, errors and the round itself
+    """
+    check = CheckInstance.objects.get(pk=check_id)
+    results = ChainHeightResult.objects.filter(
+        check_instance_id=check_id, blockchain__service__private=False
+    ).values_list(
+        'blockchain__service__slug', 'blockchain__slug', 'status', 'height', 'lag', 'duration',
+        'error_details__tag', 'error_details__error_message'
+    )
+    increments = defaultdict(float)
+    gauges = {}
+    chains = {}
+    for service, chain, status, height, lag, duration, tag, error in results:
+        ok = status == RESULT_STATUS_OK
+        chains[sample('chain_heights_up', service=service, chain=chain)] = int(ok)
+        if ok:
+            chains[sample('chain_heights_height', service=service, chain=chain)] = height
+            if lag is not None:
+                chains[sample('chain_heights_lag', service=service, chain=chain)] = -lag
+        # results of the round deadline never got an answer, their duration is the deadline
+        if error != ROUND_TIMEOUT_ERROR:
+            observe(increments, 'chain_heights_check_duration_seconds', duration / 1000,
+                    settings.METRICS_DURATION_BUCKETS, service=service)
+        if tag:
+            increments[sample('chain_heights_check_errors_total',
+                              type='height', service=service, tag=tag)] += 1
+    _round(increments, gauges, check, 'height')
+    try:
+        _apply(increments, gauges, chains)
+    except RedisError:
+        logger.warning(f'unable to record metrics of height check {check_id}', exc_info=True)
+
+
+def record_ping_check(check):
+    pings = PingResult.objects.filter(
+        check_instance=check, service__private=False
+    ).values_list('service__slug', 'duration', 'error_details__tag', 'error_details__error_message')
+    increments = defaultdict(float)
+    gauges = {}
+    for service, duration, tag, error in pings:
+        if error != ROUND_TIMEOUT_ERROR:
+            observe(increments, 'chain_heights_ping_duration_seconds', duration / 1000,
+                    settings.METRICS_DURATION_BUCKETS, service=service)
+        if tag:
+            increments[sample('chain_heights_check_errors_total',
+                              type='ping', service=service, tag=tag)] += 1
+    _round(increments, gauges, check, 'ping')
+    try:
+        _apply(increments, gauges)
+    except RedisError:
+        logger.warning(f'unable to record metrics of ping check {check.pk}', exc_info=True)
+
+
+def record_validation(instance):
+    chain = instance.blockchain
+    if chain.service.private:
+        return
+    increments = defaultdict(float)
+    observe(increments, 'chain_heights_validation_duration_seconds',
+            (instance.completed - instance.started).total_seconds(),
+            settings.METRICS_VALIDATION_BUCKETS, service=chain.service.slug, chain=chain.slug)
+    try:
+        _apply(increments)
+    except RedisError:
+        logger.warning(f'unable to record metrics of validation {instance.pk}', exc_info=True)
+
+
+def _family(name):
+    if name not in METRICS:
+        for suffix in HISTOGRAM_SUFFIXES:
+            if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+                return name[:-len(suffix)]
+    return name
+
+
+def _sample_order(field):
+    """
+    Groups the samples of a label set together, with the buckets of a histogram in
+    increasing order as the exposition format requires
+    """
+    name, _, labels = field.partition('{')
+    labels, _, le = labels.rstrip('}').partition('le="')
+    return labels.rstrip(','), name, float(le.rstrip('"')) if le else 0
+
+
+def render():
+    """
+    The snapshot in the Prometheus text exposition format
+    """
+    with get_redis().pipeline(transaction=False) as pipe:
+        pipe.hgetall(CHAINS_KEY)
+        pipe.hgetall(METRICS_KEY)
+        snapshots = pipe.execute()
+    families = defaultdict(dict)
+    for snapshot in snapshots:
+        for field, value in snapshot.items():
+            field = field.decode()
+            families[_family(field.partition('{')[0])][field] = value.decode()
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        samples = families.get(name)
+        if not samples:
+            continue
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(f'{field} {samples[field]}' for field in sorted(samples, key=_sample_order))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,36 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that also runs in an async middleware chain. A sync-only middleware makes
+    Django run the whole chain on its one thread-sensitive thread under ASGI, every
+    request then holds that thread while its view waits on the pool and the async views
+    are served one at a time
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=None):
+        if settings is None:
+            super().__init__(get_response)
+        else:
+            super().__init__(get_response, settings)
+        if asyncio.iscoroutinefunction(self.get_response):
+            # lets Django see the instance as a coroutine function, like MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        # static files are looked up (with autorefresh) and opened off the event loop
+        if self.autorefresh or request.path_info in self.files:
+            response = await sync_to_async(self.process_request, thread_sensitive=False)(request)
+            if response is not None:
+                return response
+        return await self.get_response(request)
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.6 on 2026-10-19 14:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0024_auto_20210706_1959'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkinstance',
+            name='deadline',
+            field=models.DateTimeField(help_text='Time after which the check is completed with whatever results arrived', null=True),
+        ),
+        migrations.AddField(
+            model_name='checkinstance',
+            name='timed_out',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.1.6 on 2026-10-19 14:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0025_auto_20261019_1436'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkerror',
+            name='fingerprint',
+            field=models.CharField(default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='checkerror',
+            name='last_seen',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='checkerror',
+            name='occurrences',
+            field=models.PositiveIntegerField(default=1, help_text='Number of times this error was seen within the hour it was first seen'),
+        ),
+        migrations.AlterField(
+            model_name='checkerror',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, help_text='First seen'),
+        ),
+        migrations.AddIndex(
+            model_name='checkerror',
+            index=models.Index(fields=['fingerprint', '-created'], name='checkerror_fingerprint'),
+        ),
+    ]
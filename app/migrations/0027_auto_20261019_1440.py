@@ -0,0 +1,34 @@
+# Generated by Django 3.1.6 on 2026-10-19 14:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0026_auto_20261019_1438'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChainHeightHourlyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('lag_sum', models.BigIntegerField(default=0, help_text='Sum of the differences from best')),
+                ('lag_count', models.IntegerField(default=0, help_text='Number of differences in lag_sum')),
+                ('error_count', models.IntegerField(default=0)),
+                ('success_count', models.IntegerField(default=0)),
+                ('blockchain', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.blockchain')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='chainheighthourlyrollup',
+            index=models.Index(fields=['-hour'], name='chainheightrollup_hour'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='chainheighthourlyrollup',
+            unique_together={('blockchain', 'hour')},
+        ),
+    ]
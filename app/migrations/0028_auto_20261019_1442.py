@@ -0,0 +1,36 @@
+# Generated by Django 3.1.6 on 2026-10-19 14:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0027_auto_20261019_1440'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PingMinutelyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minute', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('error_count', models.IntegerField(default=0)),
+                ('duration_min', models.IntegerField(default=0)),
+                ('duration_max', models.IntegerField(default=0)),
+                ('duration_sum', models.BigIntegerField(default=0)),
+                ('sketch', models.JSONField(default=dict, help_text='Latency sketch, see app.sketch')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.service')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pingminutelyrollup',
+            index=models.Index(fields=['-minute'], name='pingrollup_minute'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='pingminutelyrollup',
+            unique_together={('service', 'minute')},
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.1.6 on 2026-10-19 14:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0028_auto_20261019_1442'),
+    ]
+
+    operations = [
+        # errors of a chain check now always carry the service of the chain as well
+        migrations.RunSQL(
+            sql='UPDATE app_checkerror SET service_id = app_blockchain.service_id '
+                'FROM app_blockchain '
+                'WHERE app_checkerror.blockchain_id = app_blockchain.id '
+                'AND app_checkerror.service_id IS NULL',
+            reverse_sql=migrations.RunSQL.noop
+        ),
+        migrations.CreateModel(
+            name='ErrorHourlyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(choices=[('timeout', 'Timeout'), ('connection', 'Connection Error'), ('ssl', 'SSL Error'), ('encoding', 'Encoding Error'), ('http', 'HTTP Error'), ('system', 'System Error'), ('unknown', 'Unknown Error')], max_length=10)),
+                ('hour', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.service')),
+            ],
+            options={
+                'unique_together': {('service', 'tag', 'hour')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.6 on 2026-10-19 14:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0029_errorhourlyrollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chainheightresult',
+            name='best_result',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='app.chainheightresult'),
+        ),
+        migrations.AlterField(
+            model_name='chainheightresult',
+            name='error_details',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.checkerror'),
+        ),
+        migrations.AlterField(
+            model_name='pingresult',
+            name='error_details',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.checkerror'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.1.6 on 2026-10-19 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0030_auto_20261019_1446'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chainheightresult',
+            name='best_height',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='chainheightresult',
+            name='best_service_slug',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='chainheightresult',
+            name='lag',
+            field=models.IntegerField(help_text='Height minus the best height of the round', null=True),
+        ),
+        migrations.AddField(
+            model_name='chainheightresult',
+            name='lag_status',
+            field=models.CharField(blank=True, choices=[('success', 'Success'), ('warning', 'Warning'), ('danger', 'Danger')], default='', max_length=7),
+        ),
+        migrations.AddIndex(
+            model_name='chainheightresult',
+            index=models.Index(fields=['lag', '-started'], name='chainheightresult_lag'),
+        ),
+        migrations.AddIndex(
+            model_name='chainheightresult',
+            index=models.Index(fields=['lag_status', '-started'], name='chainheightresult_lag_status'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.6 on 2026-10-19 14:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0031_auto_20261019_1449'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestChainStatus',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('check_started', models.DateTimeField()),
+                ('check_completed', models.DateTimeField()),
+                ('service_slug', models.CharField(max_length=50)),
+                ('chain_slug', models.CharField(max_length=60)),
+                ('private', models.BooleanField(default=False)),
+                ('started', models.DateTimeField()),
+                ('duration', models.IntegerField(help_text='Duration in milliseconds')),
+                ('status', models.CharField(choices=[('ok', 'Ok'), ('er', 'Error'), ('wr', 'Warn')], max_length=2)),
+                ('height', models.IntegerField(default=0)),
+                ('best_height', models.IntegerField(null=True)),
+                ('best_service_slug', models.CharField(default='', max_length=50)),
+                ('lag', models.IntegerField(help_text='Height minus the best height of the check', null=True)),
+                ('lag_status', models.CharField(blank=True, choices=[('success', 'Success'), ('warning', 'Warning'), ('danger', 'Danger')], default='', max_length=7)),
+                ('error', models.TextField(default='')),
+                ('blockchain', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='latest_status', to='app.blockchain')),
+                ('check_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='latest_statuses', to='app.checkinstance')),
+            ],
+        ),
+    ]
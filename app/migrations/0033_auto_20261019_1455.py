@@ -0,0 +1,69 @@
+# Generated by Django 3.1.6 on 2026-10-19 14:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+import gzip
+import json
+
+PAYLOAD_FIELDS = ('request_headers', 'request_body', 'response_headers', 'response_body', 'traceback')
+
+
+def move_payloads(apps, schema_editor):
+    CheckError = apps.get_model('app', 'CheckError')
+    CheckErrorPayload = apps.get_model('app', 'CheckErrorPayload')
+    batch = []
+    rows = CheckError.objects.values_list('id', *PAYLOAD_FIELDS)
+    for error_id, *values in rows.iterator(chunk_size=1000):
+        payload = {name: value for name, value in zip(PAYLOAD_FIELDS, values) if value}
+        if not payload:
+            continue
+        data = gzip.compress(json.dumps(payload).encode(), compresslevel=6)
+        batch.append(CheckErrorPayload(error_id=error_id, data=data))
+        if len(batch) >= 1000:
+            CheckErrorPayload.objects.bulk_create(batch)
+            batch = []
+    CheckErrorPayload.objects.bulk_create(batch)
+    # created is auto_now_add, the moved payloads take the time of their error instead
+    schema_editor.execute(
+        f'UPDATE {CheckErrorPayload._meta.db_table} p SET created = e.created '
+        f'FROM {CheckError._meta.db_table} e WHERE e.id = p.error_id'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0032_latestchainstatus'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckErrorPayload',
+            fields=[
+                ('error', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='payload_blob', serialize=False, to='app.checkerror')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('data', models.BinaryField()),
+            ],
+        ),
+        migrations.RunPython(move_payloads, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='checkerror',
+            name='request_body',
+        ),
+        migrations.RemoveField(
+            model_name='checkerror',
+            name='request_headers',
+        ),
+        migrations.RemoveField(
+            model_name='checkerror',
+            name='response_body',
+        ),
+        migrations.RemoveField(
+            model_name='checkerror',
+            name='response_headers',
+        ),
+        migrations.RemoveField(
+            model_name='checkerror',
+            name='traceback',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.6 on 2026-10-19 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0033_auto_20261019_1455'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blockvalidationinstance',
+            index=models.Index(fields=['-completed'], name='blockvalidationinst_completed'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.1.6 on 2026-10-19 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0034_auto_20261019_1459'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='chainheightresult',
+            name='chainheightresult_started',
+        ),
+        migrations.RemoveIndex(
+            model_name='pingresult',
+            name='pingresult_started',
+        ),
+        migrations.AddIndex(
+            model_name='blockvalidationresult',
+            index=models.Index(fields=['-started', '-id'], name='blockvalidationres_started_id'),
+        ),
+        migrations.AddIndex(
+            model_name='blockvalidationresult',
+            index=models.Index(fields=['blockchain', '-started', '-id'], name='blockvalidationres_chain_id'),
+        ),
+        migrations.AddIndex(
+            model_name='chainheightresult',
+            index=models.Index(fields=['-started', '-id'], name='chainheightresult_started_id'),
+        ),
+        migrations.AddIndex(
+            model_name='chainheightresult',
+            index=models.Index(fields=['blockchain', '-started', '-id'], name='chainheightresult_chain_id'),
+        ),
+        migrations.AddIndex(
+            model_name='pingresult',
+            index=models.Index(fields=['-started', '-id'], name='pingresult_started_id'),
+        ),
+        migrations.AddIndex(
+            model_name='pingresult',
+            index=models.Index(fields=['service', '-started', '-id'], name='pingresult_service_id'),
+        ),
+    ]
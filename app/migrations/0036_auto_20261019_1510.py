@@ -0,0 +1,17 @@
+# Generated by Django 3.1.6 on 2026-10-19 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0035_auto_20261019_1504'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blockvalidationresult',
+            index=models.Index(fields=['blockchain', 'height'], name='blockvalidationres_height'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.6 on 2026-10-19 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0036_auto_20261019_1510'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pingminutelyrollup',
+            name='timeout_count',
+            field=models.IntegerField(default=0, help_text='Pings recorded for the round deadline, without a duration'),
+        ),
+        migrations.AlterField(
+            model_name='pingminutelyrollup',
+            name='duration_max',
+            field=models.IntegerField(help_text='Null when no ping got an answer', null=True),
+        ),
+        migrations.AlterField(
+            model_name='pingminutelyrollup',
+            name='duration_min',
+            field=models.IntegerField(help_text='Null when no ping got an answer', null=True),
+        ),
+    ]
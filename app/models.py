@@ -1,13 +1,21 @@
 import re
+import gzip
+import json
+import random
+import hashlib
 import datetime
-from collections import defaultdict
-from django.db import models
-from django.db.models import Q, F, Avg, Count, Max, Min
-from django.db.models.functions import Trunc
+from collections import defaultdict, namedtuple
+import numpy as np
+from django.conf import settings
+from django.db import models, connection, connections, transaction
+from django.db.models import Q, F
 from django.contrib.postgres.fields import ArrayField
 from django.utils import timezone
 from autoslug import AutoSlugField
 
+from .sketch import LatencySketch, LOG_GAMMA
+from .series import Buckets, epoch, lttb, downsample, to_columns, to_list
+
 CHECK_TYPE_BLOCK_HEIGHT = 'bh'
 CHECK_TYPE_PING = 'p'
 CHECK_TYPE_BLOCK_VALIDATION = 'bv'
@@ -27,6 +35,17 @@ RESULT_STATUSES = (
     (RESULT_STATUS_WARN, 'Warn')
 )
 
+# how far a result is behind the best height of its round, named after the bootstrap
+# contextual classes the pages render them with
+LAG_STATUS_SUCCESS = 'success'
+LAG_STATUS_WARNING = 'warning'
+LAG_STATUS_DANGER = 'danger'
+LAG_STATUSES = (
+    (LAG_STATUS_SUCCESS, 'Success'),
+    (LAG_STATUS_WARNING, 'Warning'),
+    (LAG_STATUS_DANGER, 'Danger')
+)
+
 
 class Service(models.Model):
     name = models.CharField(max_length=60)
@@ -76,6 +95,15 @@ class BlockchainMeta(models.Model):
     def __str__(self):
         return self.display_name
 
+    def get_lag_status(self, lag):
+        if lag <= -abs(self.height_tolerance_error) or lag > 0:
+            return LAG_STATUS_DANGER
+        if lag <= -abs(self.height_tolerance_warning):
+            return LAG_STATUS_WARNING
+        if lag >= -abs(self.height_tolerance_success):
+            return LAG_STATUS_SUCCESS
+        return ''
+
 
 class Blockchain(models.Model):
     name = models.CharField(max_length=60)
@@ -113,20 +141,44 @@ class Blockchain(models.Model):
             self.save()
 
 
+ROUND_TIMEOUT_ERROR = 'Timed out waiting for a result before the round deadline'
+
+
 class CheckInstanceQuerySet(models.QuerySet):
-    def delete_expired(self, distance=datetime.timedelta(days=10)):
-        now = timezone.now()
-        then = now - distance
-        return self.filter(
-            started__lt=then,
-            completed__isnull=False
-        ).delete()
+    def mark_completed(self, pk, timed_out=False):
+        """
+        Complete the check if nobody else has yet, returns whether this call completed it
+        """
+        updated = self.filter(pk=pk, completed__isnull=True).update(
+            completed=timezone.now(), timed_out=timed_out
+        )
+        return updated == 1
+
+    def lock_if_open(self, pk):
+        """
+        Share-lock an incomplete check so results can be attached to it, returns False
+        once the check has been completed. Must be called inside a transaction: completing
+        the check waits for the lock, so a result either lands before finalization or is
+        dropped, never in between
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT 1 FROM {self.model._meta.db_table} '
+                f'WHERE id = %s AND completed IS NULL FOR SHARE',
+                [pk]
+            )
+            return cursor.fetchone() is not None
 
 
 class CheckInstance(models.Model):
     type = models.CharField(choices=CHECK_TYPES, max_length=2, db_column='check_type')
     started = models.DateTimeField()
     completed = models.DateTimeField(null=True)
+    deadline = models.DateTimeField(
+        null=True,
+        help_text='Time after which the check is completed with whatever results arrived'
+    )
+    timed_out = models.BooleanField(default=False)
 
     objects = CheckInstanceQuerySet.as_manager()
 
@@ -158,55 +210,11 @@ class ChainHeightResultQuerySet(models.QuerySet):
     def no_errors(self):
         return self.exclude(~Q(error_details__isnull=True) | ~Q(error=''))
 
-    def common_related(self):
-        return self.select_related(
-            'blockchain', 'blockchain__service', 'blockchain__meta',
-            'best_result__blockchain', 'best_result__blockchain__service'
-        )
+    def lagging(self, blocks):
+        return self.filter(lag__lte=-abs(blocks))
 
-    def get_hourly_stats(self, distance=datetime.timedelta(days=7)):
-        now = timezone.now()
-        then = now - distance
-        averages = self.filter(
-            check_instance__type__exact=CHECK_TYPE_BLOCK_HEIGHT,
-            check_instance__completed__isnull=False,
-            check_instance__completed__gt=then
-        ).annotate(
-            started_hour=Trunc('started', 'hour'),
-            diff=F('height') - F('best_result__height')
-        ).values(
-            'blockchain__slug', 'started_hour'
-        ).annotate(
-            diff_avg=Avg('diff', filter=Q(error_details__isnull=True) & Q(error='')),
-            error_count=Count('id',
-                              filter=Q(error_details__isnull=False) | ~Q(error='')),
-            success_count=Count('id',
-                                filter=Q(error_details__isnull=True) & Q(error=''))
-        )
-        tick_time_format = '%y-%m-%d %H:00'
-        during_buckets = defaultdict(dict)
-        for agg in averages:
-            time_bucket = agg['started_hour'].strftime(tick_time_format)
-            during_buckets[agg['blockchain__slug']][time_bucket] = {
-                'diff_avg': agg['diff_avg'],
-                'error_count': agg['error_count'],
-                'success_count': agg['success_count']
-            }
-        hours = int(distance.total_seconds() / 60 / 60)
-        chains = defaultdict(lambda: {'labels': [], 'data': []})
-        known_chains = list(during_buckets.keys())
-        known_chains.sort()
-        empty_value = {'diff_avg': 0.0, 'error_count': 0, 'success_count': 0}
-        for i in range(hours, -1, -1):
-            date = (now - datetime.timedelta(hours=i)).replace(minute=0, second=0,
-                                                               microsecond=0)
-            tick_date = date.strftime(tick_time_format)
-            for chain_id in known_chains:
-                value = dict(empty_value)
-                value.update(during_buckets[chain_id].get(tick_date, empty_value))
-                chains[chain_id]['labels'].append(tick_date)
-                chains[chain_id]['data'].append(value)
-        return chains
+    def common_related(self):
+        return self.select_related('blockchain', 'blockchain__service', 'blockchain__meta')
 
 
 class ChainHeightResult(models.Model):
@@ -218,16 +226,25 @@ class ChainHeightResult(models.Model):
     status = models.CharField(max_length=2, choices=RESULT_STATUSES)
     height = models.IntegerField(default=0)
     error = models.TextField(default='')
-    error_details = models.ForeignKey('CheckError', null=True,
+    # no database constraints towards tables that may be partitioned (see app.partitions)
+    error_details = models.ForeignKey('CheckError', null=True, db_constraint=False,
                                       on_delete=models.SET_NULL)
     best_result = models.ForeignKey('ChainHeightResult', on_delete=models.CASCADE,
-                                    null=True)
+                                    null=True, db_constraint=False)
+    # copied from the best result when the round completes, null on older rows
+    best_height = models.IntegerField(null=True)
+    best_service_slug = models.CharField(max_length=50, default='')
+    lag = models.IntegerField(null=True, help_text='Height minus the best height of the round')
+    lag_status = models.CharField(max_length=7, choices=LAG_STATUSES, blank=True, default='')
 
     objects = ChainHeightResultQuerySet.as_manager()
 
     class Meta:
         indexes = [
-            models.Index(fields=('-started',), name='chainheightresult_started')
+            models.Index(fields=('-started', '-id'), name='chainheightresult_started_id'),
+            models.Index(fields=('blockchain', '-started', '-id'), name='chainheightresult_chain_id'),
+            models.Index(fields=('lag', '-started'), name='chainheightresult_lag'),
+            models.Index(fields=('lag_status', '-started'), name='chainheightresult_lag_status')
         ]
 
     def __str__(self):
@@ -246,67 +263,268 @@ class ChainHeightResult(models.Model):
     def duration_ms(self):
         return f'{self.duration}ms'
 
+    def set_best_result(self, best):
+        self.best_result = best
+        self.best_height = best.height
+        self.best_service_slug = best.blockchain.service.slug
+        self.lag = self.height - best.height
+        meta = self.blockchain.meta
+        self.lag_status = meta.get_lag_status(self.lag) if meta is not None else ''
+
     def best_service(self):
-        if self.best_result is None:
+        if self.best_service_slug:
+            return self.best_service_slug
+        if self.best_result_id is None:
             return 'unknown'
         return self.best_result.blockchain.service.slug
 
     def difference_from_best(self):
-        if self.best_result is None:
+        if self.lag is not None:
+            return self.lag
+        if self.best_result_id is None:
             return 0
         return self.height - self.best_result.height
 
     difference_from_best.short_description = 'Diff'
 
     def difference_from_best_status(self):
-        diff = self.difference_from_best()
-        if diff <= -abs(self.blockchain.meta.height_tolerance_error) or diff > 0:
-            return 'danger'
-        if diff <= -abs(self.blockchain.meta.height_tolerance_warning):
-            return 'warning'
-        if diff >= -abs(self.blockchain.meta.height_tolerance_success):
-            return 'success'
+        if self.lag is None:
+            return self.blockchain.meta.get_lag_status(self.difference_from_best()) or None
+        return self.lag_status or None
 
+    def has_error(self):
+        return self.error_details_id is not None or self.error != ''
 
-class PingResultQuerySet(models.QuerySet):
-    def get_minutely_stats(self, distance=datetime.timedelta(days=7)):
-        now = timezone.now()
-        then = now - distance
-        results = self.filter(
-            check_instance__type__exact=CHECK_TYPE_PING,
-            check_instance__completed__isnull=False,
-            check_instance__completed__gt=then,
-        ).annotate(
-            started_minute=Trunc('started', 'minute'),
-        ).values(
-            'started_minute'
-        ).annotate(
-            min_dur=Min('duration'),
-            max_dur=Max('duration'),
-            avg_dur=Avg('duration'),
-            error_count=Count('id', filter=Q(error_details__isnull=False))
+
+class ChainHeightHourlyRollupQuerySet(models.QuerySet):
+    def for_service(self, service):
+        return self.filter(blockchain__service=service).exclude(
+            Q(blockchain__meta__isnull=True) | Q(blockchain__ignore=True)
         )
-        tick_time_format = '%y-%m-%d %H:%M'
-        tick_buckets = {}
+
+    def add_results(self, results):
+        """
+        Add the results of a completed height check, which must have their best result set,
+        to the totals of the hours they were started in
+        """
+        totals = defaultdict(lambda: [0, 0, 0, 0])
         for result in results:
-            result['avg_dur'] = int(result['avg_dur'])
-            time_bucket = result['started_minute'].strftime(tick_time_format)
-            tick_buckets[time_bucket] = result
-        all_ticks = []
-        minutes = int(distance.total_seconds() / 60)
-        for i in range(minutes, -1, -1):
-            date = (now - datetime.timedelta(minutes=i)).replace(second=0,
-                                                                 microsecond=0)
-            tick_date = date.strftime(tick_time_format)
-            tick = [0, 0, 0, 0, int(date.timestamp())]
-            tick_result = tick_buckets.get(tick_date, None)
-            if tick_result is not None:
-                tick[0] = tick_result['min_dur']
-                tick[1] = tick_result['max_dur']
-                tick[2] = tick_result['avg_dur']
-                tick[3] = tick_result['error_count']
-            all_ticks.append(tick)
-        return all_ticks
+            hour = result.started.replace(minute=0, second=0, microsecond=0)
+            total = totals[(result.blockchain_id, hour)]
+            if result.has_error():
+                total[2] += 1
+                continue
+            if result.lag is not None:
+                total[0] += result.lag
+                total[1] += 1
+            total[3] += 1
+        if not totals:
+            return
+        rows = [(blockchain_id, hour, *total) for (blockchain_id, hour), total in totals.items()]
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {self.model._meta.db_table} AS rollup
+                    (blockchain_id, hour, lag_sum, lag_count, error_count, success_count)
+                VALUES {", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(rows))}
+                ON CONFLICT (blockchain_id, hour) DO UPDATE SET
+                    lag_sum = rollup.lag_sum + EXCLUDED.lag_sum,
+                    lag_count = rollup.lag_count + EXCLUDED.lag_count,
+                    error_count = rollup.error_count + EXCLUDED.error_count,
+                    success_count = rollup.success_count + EXCLUDED.success_count
+            ''', [value for row in rows for value in row])
+
+    def rebuild(self, since):
+        """
+        Recompute the totals of every hour since the given time from the raw results
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {self.model._meta.db_table}
+                    (blockchain_id, hour, lag_sum, lag_count, error_count, success_count)
+                SELECT r.blockchain_id, date_trunc('hour', r.started),
+                    COALESCE(SUM(COALESCE(r.lag, r.height - b.height)) FILTER (WHERE r.ok), 0),
+                    COUNT(COALESCE(r.lag, b.id)) FILTER (WHERE r.ok),
+                    COUNT(*) FILTER (WHERE NOT r.ok),
+                    COUNT(*) FILTER (WHERE r.ok)
+                FROM (
+                    SELECT *, error_details_id IS NULL AND error = '' AS ok
+                    FROM {ChainHeightResult._meta.db_table}
+                ) r
+                JOIN {CheckInstance._meta.db_table} c ON c.id = r.check_instance_id
+                LEFT JOIN {ChainHeightResult._meta.db_table} b ON b.id = r.best_result_id
+                WHERE c.check_type = %s AND c.completed IS NOT NULL AND r.started >= %s
+                GROUP BY 1, 2
+                ON CONFLICT (blockchain_id, hour) DO UPDATE SET
+                    lag_sum = EXCLUDED.lag_sum,
+                    lag_count = EXCLUDED.lag_count,
+                    error_count = EXCLUDED.error_count,
+                    success_count = EXCLUDED.success_count
+            ''', [CHECK_TYPE_BLOCK_HEIGHT, since])
+            return cursor.rowcount
+
+    def get_hourly_stats(self, distance=datetime.timedelta(days=7), end=None, points=None):
+        """
+        Hourly series by chain slug of the average difference from best (null for hours
+        without one) and the error and success counts, with the hour labels. Series longer
+        than the given number of points are downsampled, all chains to the same hours
+        """
+        buckets = Buckets.ending_at(end or timezone.now(), datetime.timedelta(hours=1), distance)
+        rows = list(self.filter(
+            hour__gte=buckets.start_datetime, hour__lt=buckets.end_datetime
+        ).values_list(
+            'blockchain__slug', 'hour', 'lag_sum', 'lag_count', 'error_count', 'success_count'
+        ))
+        labels = np.array(buckets.labels())
+        chains = defaultdict(lambda: {
+            'labels': labels.tolist(),
+            'data': {'diff_avg': [], 'error_count': [], 'success_count': []}
+        })
+        if not rows:
+            return chains
+        slugs, hours, lag_sums, lag_counts, error_counts, success_counts = zip(*rows)
+        times = [epoch(hour) for hour in hours]
+        known_chains, seen = buckets.dense(times, np.ones(len(rows)), keys=slugs)
+        _, lag_sum = buckets.dense(times, lag_sums, keys=slugs)
+        _, lag_count = buckets.dense(times, lag_counts, keys=slugs)
+        _, error_count = buckets.dense(times, error_counts, keys=slugs, dtype=np.int64)
+        _, success_count = buckets.dense(times, success_counts, keys=slugs, dtype=np.int64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            diff_avg = np.where(lag_count > 0, lag_sum / lag_count, np.nan)
+        diff_avg[seen == 0] = 0.0
+        # the chains are drawn against one set of labels, so they keep the same hours: the
+        # ones LTTB picks on the largest difference from best of any chain in each hour
+        indices = slice(None)
+        if points:
+            indices = lttb(buckets.times(), np.nan_to_num(np.abs(diff_avg)).max(axis=0), points)
+        labels = labels[indices]
+        for i, slug in enumerate(known_chains):
+            chains[slug]['labels'] = labels.tolist()
+            chains[slug]['data'] = to_columns(
+                diff_avg=diff_avg[i][indices], error_count=error_count[i][indices],
+                success_count=success_count[i][indices]
+            )
+        return chains
+
+
+class ChainHeightHourlyRollup(models.Model):
+    """
+    Hourly totals of the height results of a blockchain, maintained as checks complete
+    """
+    blockchain = models.ForeignKey(Blockchain, on_delete=models.CASCADE)
+    hour = models.DateTimeField()
+    lag_sum = models.BigIntegerField(default=0, help_text='Sum of the differences from best')
+    lag_count = models.IntegerField(default=0, help_text='Number of differences in lag_sum')
+    error_count = models.IntegerField(default=0)
+    success_count = models.IntegerField(default=0)
+
+    objects = ChainHeightHourlyRollupQuerySet.as_manager()
+
+    class Meta:
+        unique_together = [
+            ('blockchain', 'hour')
+        ]
+        indexes = [
+            models.Index(fields=('-hour',), name='chainheightrollup_hour')
+        ]
+
+    def __str__(self):
+        return f'{self.blockchain} {self.hour}'
+
+
+class LatestChainStatusQuerySet(models.QuerySet):
+    status_columns = (
+        'check_instance_id', 'check_started', 'check_completed', 'service_slug', 'chain_slug',
+        'private', 'started', 'duration', 'status', 'height', 'best_height',
+        'best_service_slug', 'lag', 'lag_status', 'error'
+    )
+
+    def refresh(self, check_id):
+        """
+        Replace the statuses with the results of a completed height check in one statement,
+        chains that were not part of the check are removed. Statuses of a newer check are
+        never overwritten
+        """
+        table = self.model._meta.db_table
+        columns = ', '.join(self.status_columns)
+        updates = ', '.join(f'{c} = EXCLUDED.{c}' for c in self.status_columns)
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                WITH latest AS (
+                    INSERT INTO {table} AS status (blockchain_id, {columns})
+                    SELECT DISTINCT ON (r.blockchain_id) r.blockchain_id,
+                        c.id, c.started, c.completed, s.slug, b.slug, s.private,
+                        r.started, r.duration, r.status, r.height, r.best_height,
+                        r.best_service_slug, r.lag, r.lag_status, r.error
+                    FROM {ChainHeightResult._meta.db_table} r
+                    JOIN {CheckInstance._meta.db_table} c ON c.id = r.check_instance_id
+                    JOIN {Blockchain._meta.db_table} b ON b.id = r.blockchain_id
+                    JOIN {Service._meta.db_table} s ON s.id = b.service_id
+                    WHERE r.check_instance_id = %s AND c.completed IS NOT NULL
+                        AND b.meta_id IS NOT NULL
+                    ORDER BY r.blockchain_id, r.id DESC
+                    ON CONFLICT (blockchain_id) DO UPDATE SET {updates}
+                    WHERE status.check_completed <= EXCLUDED.check_completed
+                    RETURNING blockchain_id, check_completed
+                )
+                DELETE FROM {table}
+                WHERE blockchain_id NOT IN (SELECT blockchain_id FROM latest)
+                    AND check_completed < (SELECT MAX(check_completed) FROM latest)
+            ''', [check_id])
+
+    def public(self):
+        return self.filter(private=False)
+
+    def latest_check(self):
+        """
+        (check id, completed) of the check the public statuses were last refreshed from,
+        None before the first one
+        """
+        return self.public().order_by('-check_completed').values_list(
+            'check_instance_id', 'check_completed'
+        ).first()
+
+
+class LatestChainStatus(models.Model):
+    """
+    Outcome of the most recently completed height check for each chain, replaced when a
+    check completes so the busiest pages read one small table instead of the results
+    """
+    blockchain = models.OneToOneField(Blockchain, on_delete=models.CASCADE,
+                                      related_name='latest_status')
+    check_instance = models.ForeignKey(CheckInstance, on_delete=models.CASCADE,
+                                       related_name='latest_statuses')
+    check_started = models.DateTimeField()
+    check_completed = models.DateTimeField()
+    service_slug = models.CharField(max_length=50)
+    chain_slug = models.CharField(max_length=60)
+    private = models.BooleanField(default=False)
+    started = models.DateTimeField()
+    duration = models.IntegerField(help_text='Duration in milliseconds')
+    status = models.CharField(max_length=2, choices=RESULT_STATUSES)
+    height = models.IntegerField(default=0)
+    best_height = models.IntegerField(null=True)
+    best_service_slug = models.CharField(max_length=50, default='')
+    lag = models.IntegerField(null=True, help_text='Height minus the best height of the check')
+    lag_status = models.CharField(max_length=7, choices=LAG_STATUSES, blank=True, default='')
+    error = models.TextField(default='')
+
+    objects = LatestChainStatusQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.service_slug} {self.chain_slug} {self.height}'
+
+    def get_check(self):
+        return CheckInstance(pk=self.check_instance_id, type=CHECK_TYPE_BLOCK_HEIGHT,
+                             started=self.check_started, completed=self.check_completed)
+
+    def difference_from_best(self):
+        return self.lag or 0
+
+    def difference_from_best_status(self):
+        return self.lag_status or None
+
+    def duration_ms(self):
+        return f'{self.duration}ms'
 
 
 class PingResult(models.Model):
@@ -316,20 +534,193 @@ class PingResult(models.Model):
     started = models.DateTimeField()
     duration = models.IntegerField()
     status = models.CharField(max_length=2, choices=RESULT_STATUSES)
-    error_details = models.ForeignKey('CheckError', null=True,
+    error_details = models.ForeignKey('CheckError', null=True, db_constraint=False,
                                       on_delete=models.SET_NULL)
 
-    objects = PingResultQuerySet.as_manager()
-
     class Meta:
         indexes = [
-            models.Index(fields=('-started',), name='pingresult_started')
+            models.Index(fields=('-started', '-id'), name='pingresult_started_id'),
+            models.Index(fields=('service', '-started', '-id'), name='pingresult_service_id')
         ]
 
     def __str__(self):
         return f'{self.service.slug} {self.get_status_display()}'
 
 
+class PingMinutelyRollupQuerySet(models.QuerySet):
+    def add_pings(self, pings, timed_out=False):
+        """
+        Add pings to the totals of the minutes they were started in. Pings recorded for a
+        round deadline (timed_out) are counted as errors, their duration is only the
+        deadline and stays out of the durations and the sketch
+        """
+        totals = {}
+        for ping in pings:
+            minute = ping.started.replace(second=0, microsecond=0)
+            key = (ping.service_id, minute)
+            if key not in totals:
+                totals[key] = [0, 0, 0, None, None, 0, LatencySketch()]
+            total = totals[key]
+            total[0] += 1
+            total[1] += 1 if ping.error_details_id is not None else 0
+            if timed_out:
+                total[2] += 1
+                continue
+            # a ping from do_ping still has the measured float, use what its column stores
+            duration = int(ping.duration)
+            total[3] = duration if total[3] is None else min(total[3], duration)
+            total[4] = duration if total[4] is None else max(total[4], duration)
+            total[5] += duration
+            total[6].add(duration)
+        if not totals:
+            return
+        rows = [
+            (service_id, minute, *total[:6], json.dumps(total[6].to_json()))
+            for (service_id, minute), total in totals.items()
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {self.model._meta.db_table} AS rollup
+                    (service_id, minute, count, error_count, timeout_count, duration_min,
+                     duration_max, duration_sum, sketch)
+                VALUES {", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb)"] * len(rows))}
+                ON CONFLICT (service_id, minute) DO UPDATE SET
+                    count = rollup.count + EXCLUDED.count,
+                    error_count = rollup.error_count + EXCLUDED.error_count,
+                    timeout_count = rollup.timeout_count + EXCLUDED.timeout_count,
+                    duration_min = LEAST(rollup.duration_min, EXCLUDED.duration_min),
+                    duration_max = GREATEST(rollup.duration_max, EXCLUDED.duration_max),
+                    duration_sum = rollup.duration_sum + EXCLUDED.duration_sum,
+                    sketch = COALESCE((
+                        SELECT jsonb_object_agg(bucket, total) FROM (
+                            SELECT bucket, SUM(n::int) AS total FROM (
+                                SELECT * FROM jsonb_each_text(rollup.sketch)
+                                UNION ALL
+                                SELECT * FROM jsonb_each_text(EXCLUDED.sketch)
+                            ) AS buckets (bucket, n)
+                            GROUP BY bucket
+                        ) AS merged
+                    ), '{{}}'::jsonb)
+            ''', [value for row in rows for value in row])
+
+    def rebuild(self, since):
+        """
+        Recompute the totals of every minute since the given time from the raw pings, the
+        pings recorded for a round deadline are told apart by their error
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {self.model._meta.db_table}
+                    (service_id, minute, count, error_count, timeout_count, duration_min,
+                     duration_max, duration_sum, sketch)
+                SELECT service_id, minute, SUM(n), SUM(errors), SUM(timeouts), MIN(dmin),
+                    MAX(dmax), COALESCE(SUM(dsum), 0),
+                    COALESCE(jsonb_object_agg(bucket, n) FILTER (WHERE bucket IS NOT NULL), '{{}}')
+                FROM (
+                    SELECT p.service_id, date_trunc('minute', p.started) AS minute,
+                        CASE WHEN e.id IS NOT NULL THEN NULL
+                            WHEN p.duration <= 1 THEN 0
+                            ELSE ceil(ln(p.duration) / %s)::int END AS bucket,
+                        COUNT(*) AS n, COUNT(p.error_details_id) AS errors, COUNT(e.id) AS timeouts,
+                        MIN(p.duration) FILTER (WHERE e.id IS NULL) AS dmin,
+                        MAX(p.duration) FILTER (WHERE e.id IS NULL) AS dmax,
+                        SUM(p.duration) FILTER (WHERE e.id IS NULL) AS dsum
+                    FROM {PingResult._meta.db_table} p
+                    JOIN {CheckInstance._meta.db_table} c ON c.id = p.check_instance_id
+                    LEFT JOIN {CheckError._meta.db_table} e
+                        ON e.id = p.error_details_id AND e.error_message = %s
+                    WHERE c.check_type = %s AND c.completed IS NOT NULL AND p.started >= %s
+                    GROUP BY 1, 2, 3
+                ) AS buckets
+                GROUP BY 1, 2
+                ON CONFLICT (service_id, minute) DO UPDATE SET
+                    count = EXCLUDED.count,
+                    error_count = EXCLUDED.error_count,
+                    timeout_count = EXCLUDED.timeout_count,
+                    duration_min = EXCLUDED.duration_min,
+                    duration_max = EXCLUDED.duration_max,
+                    duration_sum = EXCLUDED.duration_sum,
+                    sketch = EXCLUDED.sketch
+            ''', [LOG_GAMMA, ROUND_TIMEOUT_ERROR, CHECK_TYPE_PING, since])
+            return cursor.rowcount
+
+    def get_minutely_stats(self, distance=datetime.timedelta(days=7),
+                           resolution=datetime.timedelta(minutes=1), end=None, points=None):
+        """
+        Columns of time (epoch seconds), min, max, avg, errors, p50, p95 and p99 with a
+        value for each period of the given resolution, merging the minutes within it.
+        Series longer than the given number of points are downsampled following the average
+        """
+        buckets = Buckets.ending_at(end or timezone.now(), resolution, distance)
+        rows = list(self.filter(
+            minute__gte=buckets.start_datetime, minute__lt=buckets.end_datetime
+        ).values_list(
+            'minute', 'count', 'error_count', 'timeout_count', 'duration_min', 'duration_max',
+            'duration_sum', 'sketch'
+        ))
+        empty = np.zeros(buckets.count, dtype=np.int64)
+        columns = {name: empty for name in ('min', 'max', 'avg', 'errors', 'p50', 'p95', 'p99')}
+        if rows:
+            minutes, counts, error_counts, timeout_counts, mins, maxes, sums, sketches = zip(*rows)
+            times = [epoch(minute) for minute in minutes]
+            # only pings that got an answer have a duration
+            count = buckets.dense(times, np.subtract(counts, timeout_counts), dtype=np.int64)
+            seen = count > 0
+            columns['errors'] = buckets.dense(times, error_counts, dtype=np.int64)
+            no_min = np.iinfo(np.int64).max
+            duration_min = buckets.dense(times, [no_min if m is None else m for m in mins],
+                                         fill=no_min, reduce=np.minimum, dtype=np.int64)
+            columns['min'] = np.where(seen, duration_min, 0)
+            columns['max'] = buckets.dense(times, [m or 0 for m in maxes], reduce=np.maximum,
+                                           dtype=np.int64)
+            duration_sum = buckets.dense(times, sums, dtype=np.int64)
+            columns['avg'] = np.where(seen, duration_sum // np.maximum(count, 1), 0)
+            # the stored sketches are merged per period, one sketch for each that has any
+            stored = defaultdict(list)
+            index, valid = buckets.index(times)
+            for i, sketch in zip(index[valid].tolist(), np.array(sketches, dtype=object)[valid]):
+                if sketch:
+                    stored[i].append(sketch)
+            merged = {i: LatencySketch.merged(period) for i, period in stored.items()}
+            for name, quantile in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+                column = empty.copy()
+                for i, sketch in merged.items():
+                    column[i] = int(sketch.quantile(quantile))
+                columns[name] = column
+        columns['time'] = buckets.times()
+        return to_columns(**downsample(columns, 'time', 'avg', points))
+
+
+class PingMinutelyRollup(models.Model):
+    """
+    Per-minute totals of the pings of a service, maintained as pings arrive
+    """
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    minute = models.DateTimeField()
+    count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    timeout_count = models.IntegerField(
+        default=0, help_text='Pings recorded for the round deadline, without a duration'
+    )
+    duration_min = models.IntegerField(null=True, help_text='Null when no ping got an answer')
+    duration_max = models.IntegerField(null=True, help_text='Null when no ping got an answer')
+    duration_sum = models.BigIntegerField(default=0)
+    sketch = models.JSONField(default=dict, help_text='Latency sketch, see app.sketch')
+
+    objects = PingMinutelyRollupQuerySet.as_manager()
+
+    class Meta:
+        unique_together = [
+            ('service', 'minute')
+        ]
+        indexes = [
+            models.Index(fields=('-minute',), name='pingrollup_minute')
+        ]
+
+    def __str__(self):
+        return f'{self.service} {self.minute}'
+
+
 ERROR_TAG_TIMEOUT = 'timeout'
 ERROR_TAG_CONNECTION = 'connection'
 ERROR_TAG_SSL = 'ssl'
@@ -368,61 +759,132 @@ def _clean_headers(headers):
     }
 
 
+# parts of an error message that vary between occurrences of the same error
+message_normalizers = [
+    (re.compile(r'\?[^\s)\'"]*'), '?'),
+    (re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.IGNORECASE), '<uuid>'),
+    (re.compile(r'0x[0-9a-f]+', re.IGNORECASE), '<hex>'),
+    (re.compile(r'\b[0-9a-f]{16,}\b', re.IGNORECASE), '<hash>'),
+    (re.compile(r'\d+'), '<n>'),
+]
+
+
+def _normalize_message(message):
+    for matcher, replacement in message_normalizers:
+        message = matcher.sub(replacement, message)
+    return message
+
+
+def _cap(text):
+    limit = settings.ERROR_PAYLOAD_MAX_LENGTH
+    if len(text) > limit:
+        return text[:limit] + f'... ({len(text) - limit} more characters not stored)'
+    return text
+
+
+def _payload_property(name, default):
+    def get(self):
+        return self.get_payload().get(name, default())
+
+    def set(self, value):
+        self.get_payload()[name] = value
+
+    return property(get, set)
+
+
 class CheckErrorQuerySet(models.QuerySet):
     def for_service(self, service):
-        return self.filter(
-            Q(blockchain__service=service) | Q(service=service)
-        ).exclude(
+        return self.filter(service=service).exclude(
             check_instance__completed__isnull=True
         )
 
-    def get_error_counts(self, distance=datetime.timedelta(days=7)):
-        tick_time_format = '%y-%m-%d %H:00'
+    def record(self, error):
+        """
+        Store an unsaved error. Repeats of an error already seen this hour only bump the
+        occurrence count of the canonical row for its fingerprint, occasionally replacing
+        its payload with the latest sample. Returns the error with the pk of the row it was
+        stored against.
+        """
         now = timezone.now()
-        then = now - distance
-        counts = self.filter(created__gt=then).annotate(
-            started_hour=Trunc('created', 'hour'),
-        ).values('tag', 'started_hour').annotate(errors=Count('tag'))
-        seen_tags = set()
-        hour_buckets = defaultdict(dict)
-        for agg in counts:
-            seen_tags.add(agg['tag'])
-            hour_buckets[agg['tag']][agg['started_hour'].strftime(tick_time_format)] = \
-                agg['errors']
-        hours = int(distance.total_seconds() / 60 / 60)
-        ticks = {'labels': [], 'data': defaultdict(list)}
-        for i in range(hours, -1, -1):
-            date = (now - datetime.timedelta(hours=i)).replace(minute=0, second=0,
-                                                               microsecond=0)
-            tick_date = date.strftime(tick_time_format)
-            ticks['labels'].append(tick_date)
-            for tag in seen_tags:
-                value = hour_buckets[tag].get(tick_date, 0)
-                ticks['data'][tag].append(value)
-        return ticks
+        if error.service_id is None and error.blockchain is not None:
+            error.service_id = error.blockchain.service_id
+        error.fingerprint = error.compute_fingerprint()
+        payload = error.get_payload()
+        for name in ('request_body', 'response_body', 'traceback'):
+            if name in payload:
+                payload[name] = _cap(payload[name])
+        with transaction.atomic():
+            # serialize writers of the same fingerprint so each hour has one canonical row
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [error.fingerprint])
+            canonical_pk = self.filter(
+                fingerprint=error.fingerprint,
+                created__gte=now.replace(minute=0, second=0, microsecond=0)
+            ).values_list('pk', flat=True).first()
+            ErrorHourlyRollup.objects.add_error(error, now)
+            if canonical_pk is None:
+                error.occurrences = 1
+                error.last_seen = now
+                error.save()
+                if payload:
+                    CheckErrorPayload.objects.create(error=error, data=CheckErrorPayload.pack(payload))
+                return error
+            updates = {'occurrences': F('occurrences') + 1, 'last_seen': now}
+            if random.random() < settings.ERROR_PAYLOAD_SAMPLE_RATE:
+                updates.update({
+                    name: getattr(error, name) for name in CheckError.sampled_fields
+                })
+                if payload:
+                    CheckErrorPayload.objects.update_or_create(
+                        error_id=canonical_pk, defaults={'data': CheckErrorPayload.pack(payload)}
+                    )
+            self.filter(pk=canonical_pk).update(**updates)
+        error.pk = canonical_pk
+        return error
 
 
 class CheckError(models.Model):
     check_instance = models.ForeignKey(CheckInstance, on_delete=models.CASCADE)
     service = models.ForeignKey(Service, null=True, on_delete=models.CASCADE)
     blockchain = models.ForeignKey(Blockchain, null=True, on_delete=models.CASCADE)
-    created = models.DateTimeField(auto_now_add=True)
+    created = models.DateTimeField(auto_now_add=True, help_text='First seen')
+    last_seen = models.DateTimeField(null=True)
+    occurrences = models.PositiveIntegerField(
+        default=1,
+        help_text='Number of times this error was seen within the hour it was first seen'
+    )
+    fingerprint = models.CharField(max_length=40, default='')
     method = models.CharField(max_length=4, default='')
     url = models.CharField(max_length=2048, default='')
-    request_headers = models.JSONField(default=dict)
-    request_body = models.TextField(default='')
     status_code = models.IntegerField(default=-1)
-    response_headers = models.JSONField(default=dict)
-    response_body = models.TextField(default='')
     error_message = models.TextField()
-    traceback = models.TextField(default='')
     tag = models.CharField(choices=ERROR_TAGS, max_length=10, default=ERROR_TAG_UNKNOWN)
 
     objects = CheckErrorQuerySet.as_manager()
 
+    # refreshed together with the payload when a repeat is sampled
+    sampled_fields = ('method', 'url', 'error_message')
+
+    # stored in CheckErrorPayload, loaded on first access
+    request_headers = _payload_property('request_headers', dict)
+    request_body = _payload_property('request_body', str)
+    response_headers = _payload_property('response_headers', dict)
+    response_body = _payload_property('response_body', str)
+    traceback = _payload_property('traceback', str)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('fingerprint', '-created'), name='checkerror_fingerprint')
+        ]
+
     def __str__(self):
         return self.error_message
 
+    def compute_fingerprint(self):
+        parts = (self.service_id, self.blockchain_id, self.tag, self.status_code,
+                 _normalize_message(self.error_message))
+        return hashlib.sha1('|'.join(str(p) for p in parts).encode()).hexdigest()
+
     def blockchain_slug(self):
         return self.blockchain.slug if self.blockchain is not None else 'n/a'
 
@@ -440,6 +902,20 @@ class CheckError(models.Model):
 
     error_message_truncated.short_description = 'Message'
 
+    def get_payload(self):
+        """
+        The request, response and traceback of the error, an unsaved error keeps them in
+        memory until it is recorded
+        """
+        if getattr(self, '_payload', None) is None:
+            self._payload = {}
+            if self.pk is not None:
+                try:
+                    self._payload = self.payload_blob.unpack()
+                except CheckErrorPayload.DoesNotExist:
+                    pass
+        return self._payload
+
     def request_headers_cleaned(self):
         return _clean_headers(self.request_headers)
 
@@ -447,6 +923,101 @@ class CheckError(models.Model):
         return _clean_headers(self.response_headers)
 
 
+class CheckErrorPayload(models.Model):
+    """
+    Gzip compressed payload of an error, kept apart so that listing errors never loads it
+    """
+    error = models.OneToOneField(CheckError, primary_key=True, on_delete=models.CASCADE,
+                                 db_constraint=False, related_name='payload_blob')
+    created = models.DateTimeField(auto_now_add=True)
+    data = models.BinaryField()
+
+    def __str__(self):
+        return f'{self.error_id} ({len(self.data)} bytes)'
+
+    @staticmethod
+    def pack(payload):
+        return gzip.compress(json.dumps(payload, default=str).encode(), compresslevel=6)
+
+    def unpack(self):
+        return json.loads(gzip.decompress(bytes(self.data)))
+
+
+class ErrorHourlyRollupQuerySet(models.QuerySet):
+    def add_error(self, error, now):
+        """
+        Count an occurrence of an error, which must have its service set, against the
+        current hour
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {self.model._meta.db_table} AS rollup (service_id, tag, hour, count)
+                VALUES (%s, %s, %s, 1)
+                ON CONFLICT (service_id, tag, hour) DO UPDATE SET count = rollup.count + 1
+            ''', [error.service_id, error.tag, now.replace(minute=0, second=0, microsecond=0)])
+
+    def rebuild(self, since):
+        """
+        Recompute the counts of every hour since the given time from the stored errors
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {self.model._meta.db_table} (service_id, tag, hour, count)
+                SELECT service_id, tag, date_trunc('hour', created), SUM(occurrences)
+                FROM {CheckError._meta.db_table}
+                WHERE service_id IS NOT NULL AND created >= %s
+                GROUP BY 1, 2, 3
+                ON CONFLICT (service_id, tag, hour) DO UPDATE SET count = EXCLUDED.count
+            ''', [since])
+            return cursor.rowcount
+
+    def get_error_counts(self, distance=datetime.timedelta(days=7)):
+        """
+        Hour labels and an hourly series of error counts by tag
+        """
+        buckets = Buckets.ending_at(timezone.now(), datetime.timedelta(hours=1), distance)
+        rows = list(self.filter(hour__gte=buckets.start_datetime).values_list(
+            'tag', 'hour', 'count'
+        ))
+        ticks = {'labels': buckets.labels(), 'data': {}}
+        if rows:
+            tags, hours, counts = zip(*rows)
+            tags, errors = buckets.dense([epoch(hour) for hour in hours], counts, keys=tags,
+                                         dtype=np.int64)
+            ticks['data'] = {tag: to_list(errors[i]) for i, tag in enumerate(tags)}
+        return ticks
+
+
+class ErrorHourlyRollup(models.Model):
+    """
+    Hourly count of the errors of a service by tag, maintained as errors are recorded
+    """
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    tag = models.CharField(choices=ERROR_TAGS, max_length=10)
+    hour = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    objects = ErrorHourlyRollupQuerySet.as_manager()
+
+    class Meta:
+        unique_together = [
+            ('service', 'tag', 'hour')
+        ]
+
+    def __str__(self):
+        return f'{self.service} {self.tag} {self.hour}'
+
+
+class BlockValidationInstanceQuerySet(models.QuerySet):
+    def latest_completed(self):
+        """
+        (id, completed) of the most recently completed validation, None before the first one
+        """
+        return self.filter(completed__isnull=False).order_by('-completed').values_list(
+            'pk', 'completed'
+        ).first()
+
+
 class BlockValidationInstance(models.Model):
     blockchain = models.ForeignKey(Blockchain, on_delete=models.CASCADE)
     start_height = models.PositiveBigIntegerField()
@@ -455,15 +1026,57 @@ class BlockValidationInstance(models.Model):
     completed = models.DateTimeField(null=True)
     timed_out = models.BooleanField(default=False)
 
+    objects = BlockValidationInstanceQuerySet.as_manager()
+
     class Meta:
         indexes = [
-            models.Index(fields=('-end_height',), name='blockvalidationresult_end')
+            models.Index(fields=('-end_height',), name='blockvalidationresult_end'),
+            models.Index(fields=('-completed',), name='blockvalidationinst_completed')
         ]
 
     def __str__(self):
         return f'{self.blockchain} {self.start_height}-{self.end_height}'
 
 
+class ValidatedBlock(namedtuple('ValidatedBlock', (
+        'blockchain_id', 'height', 'status', 'hash_mismatch', 'transactions',
+        'missing_transactions'))):
+    """
+    What the validation table shows of a result, with transaction counts in place of ids
+    """
+    def block_status(self):
+        if self.missing_transactions or self.hash_mismatch:
+            return 'danger'
+        return 'success'
+
+
+class BlockValidationResultQuerySet(models.QuerySet):
+    def first_blocks(self, limit):
+        """
+        The `limit` lowest validated heights of every chain of a public service as
+        ValidatedBlock, ordered by chain and height, in one query
+        """
+        # a LATERAL top-n per chain reads `limit` rows from the (blockchain, height) index
+        # for each chain instead of ranking every result
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(f'''
+                SELECT r.*
+                FROM {Blockchain._meta.db_table} b
+                JOIN {Service._meta.db_table} s ON s.id = b.service_id
+                CROSS JOIN LATERAL (
+                    SELECT blockchain_id, height, status, hash_mismatch,
+                        cardinality(transaction_ids), cardinality(missing_transaction_ids)
+                    FROM {self.model._meta.db_table}
+                    WHERE blockchain_id = b.id
+                    ORDER BY height
+                    LIMIT %s
+                ) r
+                WHERE NOT s.private
+                ORDER BY r.blockchain_id, r.height
+            ''', [limit])
+            return [ValidatedBlock(*row) for row in cursor.fetchall()]
+
+
 class BlockValidationResult(models.Model):
     blockchain = models.ForeignKey(
         to=Blockchain, on_delete=models.CASCADE, related_name='validation_results'
@@ -511,12 +1124,17 @@ class BlockValidationResult(models.Model):
                   'check result'
     )
 
+    objects = BlockValidationResultQuerySet.as_manager()
+
     class Meta:
         unique_together = [
             ('validation_instance', 'height')
         ]
         indexes = [
-            models.Index(fields=('height',), name='height_index')
+            models.Index(fields=('height',), name='height_index'),
+            models.Index(fields=('-started', '-id'), name='blockvalidationres_started_id'),
+            models.Index(fields=('blockchain', '-started', '-id'), name='blockvalidationres_chain_id'),
+            models.Index(fields=('blockchain', 'height'), name='blockvalidationres_height')
         ]
 
     def __str__(self):
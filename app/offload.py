@@ -0,0 +1,48 @@
+"""
+Lets the read views run as async views without blocking the event loop.
+
+The ORM only has a synchronous API, so `async_view` turns a regular view into an async
+one that runs, database queries and template rendering included, on a bounded pool of
+ASYNC_VIEW_THREADS threads per process. Under an ASGI server a slow query then ties up
+one of those threads instead of a whole worker process, while the event loop keeps
+accepting requests. Under WSGI Django simply runs the async view to completion.
+Every pool thread keeps its own database connection, opened and recycled like the
+request threads' connections.
+"""
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.ASYNC_VIEW_THREADS,
+                                       thread_name_prefix='async-view')
+    return _executor
+
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """
+    Run a synchronous view on the pool, keeping the caller's context variables
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        context = contextvars.copy_context()
+        return await asyncio.get_event_loop().run_in_executor(
+            get_executor(), context.run, _run, view, (request, *args), kwargs
+        )
+    return wrapper
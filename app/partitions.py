@@ -0,0 +1,165 @@
+"""
+Daily range partitions for the high volume result tables.
+
+Partitioning is opt-in: `manage.py partition_results --convert` turns the existing
+tables into partitioned parents once (the old rows stay behind as one legacy partition),
+after which future days are created ahead of time and expired days are dropped whole
+instead of deleting rows. Until a table is converted everything here leaves it alone.
+"""
+import re
+import datetime
+import logging
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ChainHeightResult, PingResult, CheckError
+
+logger = logging.getLogger(__name__)
+
+# (model, partition key) - postgres needs the key in every unique constraint, so the
+# primary keys become (id, key) and nothing may hold a foreign key to these tables
+PARTITIONED_MODELS = (
+    (ChainHeightResult, 'started'),
+    (PingResult, 'started'),
+    (CheckError, 'created'),
+)
+
+partition_bound_re = re.compile(r"TO \('([^']+)'\)")
+
+
+def _table(model):
+    return model._meta.db_table
+
+
+def _day(dt):
+    return dt.astimezone(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _fetch(cursor, sql, params=None):
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+def is_partitioned(model):
+    with connection.cursor() as cursor:
+        rows = _fetch(cursor, "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)",
+                      [_table(model)])
+    return bool(rows) and rows[0][0] == 'p'
+
+
+def get_partitions(model):
+    """
+    Returns (partition name, upper bound) for each partition of a model, oldest first
+    """
+    with connection.cursor() as cursor:
+        rows = _fetch(cursor, """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+        """, [_table(model)])
+    partitions = []
+    for name, bound in rows:
+        match = partition_bound_re.search(bound)
+        if match is None:
+            continue
+        partitions.append((name, parse_datetime(match.group(1))))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def convert(model, key):
+    """
+    Turn a plain table into a partitioned one. The existing table is renamed and attached
+    as a single partition holding everything up to tomorrow, so no rows are copied. Takes
+    an exclusive lock on the table for the duration, meant to be run once per deployment
+    """
+    table = _table(model)
+    legacy = f'{table}_legacy'
+    first_day = _day(timezone.now()) + datetime.timedelta(days=1)
+    partitioned_tables = [_table(m) for m, _ in PARTITIONED_MODELS]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+        indexes = _fetch(cursor, """
+            SELECT i.relname, pg_get_indexdef(x.indexrelid)
+            FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+            WHERE x.indrelid = to_regclass(%s) AND NOT x.indisprimary
+        """, [table])
+        foreign_keys = _fetch(cursor, """
+            SELECT conname, pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE contype = 'f' AND conrelid = to_regclass(%s)
+              AND confrelid::regclass::text <> ALL(%s)
+        """, [table, partitioned_tables])
+        referenced_by = _fetch(cursor, """
+            SELECT conrelid::regclass::text, conname
+            FROM pg_constraint
+            WHERE contype = 'f' AND confrelid = to_regclass(%s)
+        """, [table])
+        if referenced_by:
+            raise ValueError(f'{table} is still referenced by foreign keys {referenced_by}, '
+                             f'run the migrations first')
+
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+        cursor.execute(f'ALTER TABLE {legacy} DROP CONSTRAINT {table}_pkey, '
+                       f'ADD CONSTRAINT {legacy}_pkey PRIMARY KEY (id, {key})')
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX {name} RENAME TO {name[:55]}_legacy')
+
+        cursor.execute(f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                       f'PARTITION BY RANGE ({key})')
+        cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, {key})')
+        sequence = _fetch(cursor, "SELECT pg_get_serial_sequence(%s, 'id')", [legacy])[0][0]
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {legacy} DROP CONSTRAINT {name}')
+            cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+
+        cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {legacy} '
+                       f"FOR VALUES FROM (MINVALUE) TO (%s)", [first_day])
+    logger.info(f'partitioned {table} by {key}, older rows kept in {legacy}')
+
+
+def create_ahead(model, days=None):
+    """
+    Make sure a partition exists for today and the next few days, returns the ones created
+    """
+    if days is None:
+        days = settings.RESULT_PARTITIONS_AHEAD
+    table = _table(model)
+    partitions = get_partitions(model)
+    start = _day(timezone.now())
+    if partitions:
+        # never overlap the range of an existing (e.g. legacy) partition
+        start = max(start, partitions[-1][1])
+    end = _day(timezone.now()) + datetime.timedelta(days=days + 1)
+    created = []
+    with connection.cursor() as cursor:
+        while start < end:
+            name = f'{table}_p{start:%Y%m%d}'
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} '
+                           f'FOR VALUES FROM (%s) TO (%s)',
+                           [start, start + datetime.timedelta(days=1)])
+            created.append(name)
+            start += datetime.timedelta(days=1)
+    return created
+
+
+def drop_expired(model, before):
+    """
+    Detach and drop every partition that only holds rows from before the given time
+    """
+    table = _table(model)
+    dropped = []
+    for name, upper in get_partitions(model):
+        if upper > before:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {name}')
+            cursor.execute(f'DROP TABLE {name}')
+        dropped.append(name)
+        logger.info(f'dropped partition {name}')
+    return dropped
+
@@ -0,0 +1,153 @@
+"""
+Removes expired checks, their results and the rollups of them in small batches.
+
+Every table has its own retention (RESULT_RETENTION_DAYS unless overridden in
+RESULT_RETENTION_DAYS_BY_MODEL) and is pruned child tables first, walking the primary
+key in batches of PRUNE_BATCH_SIZE rows. Each batch is its own short transaction that
+skips rows locked by live check ingestion and gives up rather than wait on a lock, with a
+pause in between, so an interrupted run simply carries on from where it stopped the next
+time. Partitioned tables (see app.partitions) first drop their expired days whole. When
+archiving is enabled (see app.archive) expired rows are exported before any of that.
+"""
+import time
+import datetime
+import logging
+from collections import namedtuple
+from django.conf import settings
+from django.db import connection, transaction, OperationalError
+from django.utils import timezone
+
+from . import partitions, archive
+from .models import CheckInstance, ChainHeightResult, PingResult, CheckError, CheckErrorPayload, \
+    ChainHeightHourlyRollup, PingMinutelyRollup, ErrorHourlyRollup
+
+logger = logging.getLogger(__name__)
+
+PrunePolicy = namedtuple('PrunePolicy', ('model', 'time_column', 'condition'))
+
+# children first, rows still referenced by a child that is not expired yet are kept
+PRUNE_POLICIES = (
+    PrunePolicy(ChainHeightResult, 'started', ''),
+    PrunePolicy(PingResult, 'started', ''),
+    PrunePolicy(CheckErrorPayload, 'created', ''),
+    PrunePolicy(CheckError, 'created', ''),
+    PrunePolicy(CheckInstance, 'started', 'completed IS NOT NULL'),
+    # the rollups are not linked to the checks and keep their own (longer) history
+    PrunePolicy(ChainHeightHourlyRollup, 'hour', ''),
+    PrunePolicy(PingMinutelyRollup, 'minute', ''),
+    PrunePolicy(ErrorHourlyRollup, 'hour', ''),
+)
+
+
+# models kept for as long as the rows they belong to, whatever their own label says
+RETENTION_OF = {
+    CheckErrorPayload: CheckError,
+}
+
+
+def get_retention(model):
+    model = RETENTION_OF.get(model, model)
+    days = settings.RESULT_RETENTION_DAYS_BY_MODEL.get(
+        model._meta.label, settings.RESULT_RETENTION_DAYS
+    )
+    return datetime.timedelta(days=days)
+
+
+def _references(model):
+    """
+    (table, column, nullable) of every foreign key pointing at the model
+    """
+    return [
+        (rel.related_model._meta.db_table, rel.field.column, rel.field.null)
+        for rel in model._meta.related_objects
+        if not rel.many_to_many
+    ]
+
+
+def _delete_batch(policy, before, after_id, batch_size):
+    """
+    Delete the next batch of expired rows after the given id, returns the number of rows
+    deleted and the last id looked at (None once there is nothing left)
+    """
+    table = policy.model._meta.db_table
+    pk = policy.model._meta.pk.column
+    condition = f'AND {policy.condition}' if policy.condition else ''
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SET LOCAL lock_timeout = %s', [f'{settings.PRUNE_LOCK_TIMEOUT}ms'])
+        cursor.execute(
+            f'SELECT {pk} FROM {table} '
+            f'WHERE {policy.time_column} < %s AND {pk} > %s {condition} '
+            f'ORDER BY {pk} LIMIT %s FOR UPDATE SKIP LOCKED',
+            [before, after_id, batch_size]
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return 0, None
+        guards = []
+        for ref_table, ref_column, nullable in _references(policy.model):
+            if nullable:
+                cursor.execute(
+                    f'UPDATE {ref_table} SET {ref_column} = NULL '
+                    f'WHERE {ref_column} = ANY(%s)'
+                    + (f' AND NOT {pk} = ANY(%s)' if ref_table == table else ''),
+                    [ids, ids] if ref_table == table else [ids]
+                )
+            else:
+                guards.append(f'AND NOT EXISTS (SELECT 1 FROM {ref_table} '
+                              f'WHERE {ref_table}.{ref_column} = {table}.{pk})')
+        cursor.execute(f'DELETE FROM {table} WHERE {pk} = ANY(%s) {" ".join(guards)}', [ids])
+        return cursor.rowcount, ids[-1]
+
+
+def prune_model(policy, batch_size=None, pause=None, progress=None):
+    """
+    Remove all expired rows of one table, returns the number of rows deleted
+    """
+    if batch_size is None:
+        batch_size = settings.PRUNE_BATCH_SIZE
+    if pause is None:
+        pause = settings.PRUNE_BATCH_PAUSE
+    label = policy.model._meta.label
+    before = timezone.now() - get_retention(policy.model)
+    archive.archive_expired(policy.model, before)
+    if partitions.is_partitioned(policy.model):
+        partitions.create_ahead(policy.model)
+        partitions.drop_expired(policy.model, before)
+
+    deleted = 0
+    after_id = 0
+    while True:
+        try:
+            count, after_id = _delete_batch(policy, before, after_id, batch_size)
+        except OperationalError as e:
+            logger.warning(f'stopped pruning {label} after {deleted} rows: {e}')
+            break
+        if after_id is None:
+            break
+        deleted += count
+        if progress is not None:
+            progress(label, deleted)
+        time.sleep(pause)
+    logger.info(f'pruned {deleted} rows of {label} from before {before}')
+    return deleted
+
+
+def archive_unpruned():
+    """
+    Archive the expired rows of models that are archived but not pruned
+    """
+    pruned = {policy.model for policy in PRUNE_POLICIES}
+    for model, _ in archive.ARCHIVED_MODELS:
+        if model not in pruned:
+            archive.archive_expired(model, timezone.now() - get_retention(model))
+
+
+def prune(batch_size=None, pause=None, progress=None):
+    """
+    Prune every table, returns the number of rows deleted per model
+    """
+    archive_unpruned()
+    return {
+        policy.model._meta.label: prune_model(policy, batch_size, pause, progress)
+        for policy in PRUNE_POLICIES
+    }
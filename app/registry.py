@@ -0,0 +1,120 @@
+"""
+Process-local registry of the Service, Blockchain and BlockchainMeta rows that check
+tasks look up on every run. These rows change rarely (when supported chains are
+refreshed or edited in the admin) so tasks read them from memory instead of the
+database. Every change bumps a version number in redis and each process reloads its
+registry once it sees a newer version.
+"""
+import time
+import logging
+from redis import RedisError
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from ._utils import get_redis
+from .models import Service, Blockchain, BlockchainMeta
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'chain-heights:registry-version'
+
+
+class Registry:
+    def __init__(self):
+        self.services_by_slug = {}
+        self.chains_by_pk = {}
+        self.chains_by_slug = {}
+        self.version = None
+        self.loaded_at = None
+        self.version_checked_at = None
+
+    def load(self):
+        # read the version first so a change made during the load triggers another one
+        version = get_version()
+        services = list(Service.objects.all())
+        chains = list(Blockchain.objects.select_related('service', 'meta'))
+        self.services_by_slug = {svc.slug: svc for svc in services}
+        self.chains_by_pk = {chain.pk: chain for chain in chains}
+        self.chains_by_slug = {(chain.service.slug, chain.slug): chain for chain in chains}
+        self.version = version
+        self.loaded_at = self.version_checked_at = time.monotonic()
+        return self
+
+    def is_stale(self):
+        now = time.monotonic()
+        if self.loaded_at is None or now - self.loaded_at > settings.REGISTRY_TTL:
+            return True
+        if now - self.version_checked_at < settings.REGISTRY_VERSION_CHECK_INTERVAL:
+            return False
+        self.version_checked_at = now
+        if get_version(default=self.version) != self.version:
+            self.loaded_at = None
+            return True
+        return False
+
+    def get_services(self):
+        return list(self.services_by_slug.values())
+
+    def get_service(self, slug):
+        return self._lookup('services_by_slug', slug, Service)
+
+    def get_chain(self, service_slug, chain_slug):
+        return self._lookup('chains_by_slug', (service_slug, chain_slug), Blockchain)
+
+    def get_chain_by_pk(self, pk):
+        return self._lookup('chains_by_pk', pk, Blockchain)
+
+    def get_checked_chains(self, service_slug):
+        """
+        The chains of a service that are checked: not ignored and with known metadata
+        """
+        return [
+            chain for chain in self.chains_by_pk.values()
+            if chain.service.slug == service_slug and not chain.ignore and chain.meta is not None
+        ]
+
+    def _lookup(self, index, key, model):
+        if key not in getattr(self, index):
+            # the row may have been created since the last load
+            self.load()
+        rows = getattr(self, index)
+        if key not in rows:
+            raise model.DoesNotExist(f'{model.__name__} {key} does not exist')
+        return rows[key]
+
+
+registry = Registry()
+
+
+def get_registry():
+    if registry.is_stale():
+        registry.load()
+    return registry
+
+
+def get_version(default=None):
+    try:
+        version = get_redis().get(VERSION_KEY)
+    except RedisError:
+        logger.warning('unable to read the registry version', exc_info=True)
+        return default
+    return int(version) if version is not None else 0
+
+
+def bump_version():
+    try:
+        get_redis().incr(VERSION_KEY)
+    except RedisError:
+        logger.warning('unable to bump the registry version', exc_info=True)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=Blockchain)
+@receiver(post_save, sender=BlockchainMeta)
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=Blockchain)
+@receiver(post_delete, sender=BlockchainMeta)
+def invalidate_registry(**kwargs):
+    transaction.on_commit(bump_version)
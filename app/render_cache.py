@@ -0,0 +1,155 @@
+"""
+Rendered dashboard pages, cached in redis per completed height check.
+
+The index page and the difftable fragment it polls only change when a height check
+completes, so they are rendered once per check and served from redis to every viewer.
+The validtable fragment likewise only changes when a block validation completes and is
+cached per latest completed validation.
+Keys carry the check id and the registry version, a new check or an edited service or
+chain simply moves on to a fresh key and old pages expire after RENDER_CACHE_TTL.
+Completing a check renders the pages ahead of the first request, and concurrent misses
+wait for the one request holding the render lock instead of all rebuilding the page.
+Without redis pages are rendered on every request like before.
+"""
+import time
+import logging
+from redis import RedisError
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from ._utils import get_redis
+from .models import LatestChainStatus
+from .registry import VERSION_KEY
+
+logger = logging.getLogger(__name__)
+
+LATEST_CHECK_KEY = 'chain-heights:latest-check'
+
+# page name: template, all rendered from the difftable context
+CACHED_PAGES = {
+    'index': 'app/index.html',
+    'difftable': 'app/difftable.html',
+}
+
+# rendered per latest completed block validation instead
+VALIDTABLE_TEMPLATE = 'app/validtable.html'
+
+
+def _page_key(name, check_id, version):
+    return f'chain-heights:page:{name}:{check_id}:{version}'
+
+
+def get_latest_check_id():
+    latest = LatestChainStatus.objects.latest_check()
+    return latest[0] if latest else None
+
+
+def _render(name):
+    """
+    Returns the rendered page and the id of the check it shows
+    """
+    from .views import get_difftable_context
+    context = get_difftable_context(None)
+    check = context['check']
+    return render_to_string(CACHED_PAGES[name], context), check.pk if check else None
+
+
+def _get_or_render(r, key, render):
+    """
+    The page cached under the key, otherwise rendered by this request while holding the
+    render lock or by the request that holds it. `render` returns the page and whether
+    it may be cached under the key
+    """
+    page = r.get(key)
+    if page is not None:
+        return page.decode()
+    lock_key = f'{key}:lock'
+    if r.set(lock_key, 1, nx=True, ex=settings.RENDER_CACHE_LOCK_TIMEOUT):
+        try:
+            page, cacheable = render()
+            if cacheable:
+                r.set(key, page, ex=settings.RENDER_CACHE_TTL)
+        finally:
+            r.delete(lock_key)
+        return page
+    deadline = time.monotonic() + settings.RENDER_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(settings.RENDER_CACHE_POLL_INTERVAL)
+        page = r.get(key)
+        if page is not None:
+            return page.decode()
+    logger.warning(f'gave up waiting for {key} to be rendered')
+    return render()[0]
+
+
+def get_page(name):
+    """
+    The page rendered for the latest check, from the cache when possible, and the id of
+    the check it shows. Right after a check completes that is still the previous check
+    until the pages of the new one are in place
+    """
+    rendered = {}
+
+    def render():
+        page, rendered['check_id'] = _render(name)
+        # a lagging replica may still show the previous check, don't cache that
+        return page, rendered['check_id'] == check_id
+
+    try:
+        r = get_redis()
+        check_id, version = r.mget(LATEST_CHECK_KEY, VERSION_KEY)
+        if check_id is None:
+            check_id = get_latest_check_id()
+            if check_id is None:
+                return _render(name)
+            r.set(LATEST_CHECK_KEY, check_id, nx=True, ex=settings.RENDER_CACHE_TTL)
+        check_id = int(check_id)
+        page = _get_or_render(r, _page_key(name, check_id, int(version or 0)), render)
+        return page, rendered.get('check_id', check_id)
+    except RedisError:
+        logger.warning(f'unable to use the render cache for {name}', exc_info=True)
+    return _render(name)
+
+
+def _render_validtable():
+    from .views import get_validtable_context
+    return render_to_string(VALIDTABLE_TEMPLATE, get_validtable_context(None))
+
+
+def get_validtable(validation_id):
+    """
+    The block validation table as of the given (latest completed) validation, from the
+    cache when possible
+    """
+    if validation_id is None:
+        return _render_validtable()
+    try:
+        r = get_redis()
+        key = _page_key('validtable', validation_id, int(r.get(VERSION_KEY) or 0))
+        return _get_or_render(r, key, lambda: (_render_validtable(), True))
+    except RedisError:
+        logger.warning('unable to use the render cache for validtable', exc_info=True)
+    return _render_validtable()
+
+
+def warm():
+    """
+    Render every page for the latest check and then make it the current one, so viewers
+    move on to the new check with the pages already in place
+    """
+    check_id = None
+    try:
+        check_id = get_latest_check_id()
+        if check_id is None:
+            return
+        r = get_redis()
+        version = int(r.get(VERSION_KEY) or 0)
+        for name in CACHED_PAGES:
+            page, rendered_check_id = _render(name)
+            if rendered_check_id == check_id:
+                r.set(_page_key(name, check_id, version), page, ex=settings.RENDER_CACHE_TTL)
+        r.set(LATEST_CHECK_KEY, check_id, ex=settings.RENDER_CACHE_TTL)
+    except Exception:
+        # runs in the on_commit hooks of the check, whatever fails here must not keep the
+        # hooks after it from running, the pages are then rendered on the first request
+        logger.warning(f'unable to warm the render cache for check {check_id}', exc_info=True)
@@ -0,0 +1,95 @@
+"""
+Optional read replica for the dashboards.
+
+With DATABASE_REPLICA_URL set the replica is configured as the `replica` database and
+this router is installed. Only code running under `replica_reads` (the public pages and
+JSON endpoints) reads from it, everything else, admin pages and celery tasks included,
+stays on the primary. Reads fall back to the primary when the replica lags behind by more
+than REPLICA_MAX_LAG or cannot be reached, and once something writes inside
+`replica_reads` the remaining reads of that block go to the primary too.
+"""
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS, DatabaseError
+
+logger = logging.getLogger(__name__)
+
+REPLICA_DB_ALIAS = 'replica'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+# seconds the replica is behind, 0 when it has replayed everything it received
+REPLICA_LAG_SQL = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+'''
+
+
+@contextmanager
+def replica_reads():
+    """
+    Let reads inside the block go to the replica, usable as a decorator
+    """
+    token = _replica_reads.set(True)
+    pin_token = _pinned_to_primary.set(False)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(pin_token)
+        _replica_reads.reset(token)
+
+
+class ReplicaLagCheck:
+    """
+    Remembers whether the replica is fresh enough to read from, asking it at most once
+    per REPLICA_LAG_CHECK_INTERVAL
+    """
+    def __init__(self):
+        self.checked_at = 0
+        self.fresh = False
+
+    def is_fresh(self):
+        now = time.monotonic()
+        if now - self.checked_at < settings.REPLICA_LAG_CHECK_INTERVAL:
+            return self.fresh
+        self.checked_at = now
+        try:
+            with connections[REPLICA_DB_ALIAS].cursor() as cursor:
+                cursor.execute(REPLICA_LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except DatabaseError as e:
+            logger.warning(f'replica unavailable, reading from the primary: {e}')
+            self.fresh = False
+            return self.fresh
+        self.fresh = lag is not None and lag <= settings.REPLICA_MAX_LAG
+        if not self.fresh:
+            logger.warning(f'replica is {lag} seconds behind, reading from the primary')
+        return self.fresh
+
+
+lag_check = ReplicaLagCheck()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and not _pinned_to_primary.get() and lag_check.is_fresh():
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if _replica_reads.get():
+            # read your own writes
+            _pinned_to_primary.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
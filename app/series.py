@@ -0,0 +1,139 @@
+"""
+Dense time series for the charts.
+
+Rollup tables only have rows for the periods that saw something while the charts want a
+value for every period. `Buckets` describes a run of equal periods as epoch seconds and
+places rows into numpy arrays with integer arithmetic, periods without rows keep a fill
+value. Series are handed to the templates as columns of plain lists, one list per value,
+with missing values (NaN) as null. Long series are cut down to a number of points for
+the browser with Largest-Triangle-Three-Buckets, which keeps the peaks and dips a chart
+of the full series would show.
+"""
+import datetime
+import numpy as np
+
+
+def epoch(dt):
+    return int(dt.timestamp())
+
+
+class Buckets:
+    """
+    `count` consecutive periods of `step` seconds, the first starting at `start`
+    """
+    def __init__(self, start, step, count):
+        self.start = start
+        self.step = step
+        self.count = count
+
+    @classmethod
+    def ending_at(cls, end, step, distance):
+        """
+        The periods covering `distance` before the period `end` falls in, that one included
+        """
+        step = int(step.total_seconds())
+        last = epoch(end) // step * step
+        count = int(distance.total_seconds()) // step + 1
+        return cls(last - (count - 1) * step, step, count)
+
+    @property
+    def start_datetime(self):
+        return datetime.datetime.fromtimestamp(self.start, datetime.timezone.utc)
+
+    @property
+    def end_datetime(self):
+        return datetime.datetime.fromtimestamp(self.start + self.count * self.step,
+                                               datetime.timezone.utc)
+
+    def times(self):
+        return self.start + self.step * np.arange(self.count, dtype=np.int64)
+
+    def labels(self):
+        """
+        Period starts formatted as 'yy-mm-dd HH:MM' (UTC)
+        """
+        return [
+            datetime.datetime.fromtimestamp(t, datetime.timezone.utc).strftime('%y-%m-%d %H:%M')
+            for t in self.times().tolist()
+        ]
+
+    def index(self, times):
+        """
+        Period of each epoch time and whether it falls within the buckets
+        """
+        index = (np.asarray(times, dtype=np.int64) - self.start) // self.step
+        return index, (index >= 0) & (index < self.count)
+
+    def dense(self, times, values, keys=None, fill=0, reduce=np.add, dtype=np.float64):
+        """
+        Combine the values falling into the same period with `reduce` (a numpy ufunc),
+        returns one array of `count` values or, with keys, the sorted distinct keys and an
+        array with a row per key
+        """
+        index, valid = self.index(times)
+        values = np.asarray(values, dtype=dtype)[valid]
+        index = index[valid]
+        if keys is None:
+            result = np.full(self.count, fill, dtype=dtype)
+            reduce.at(result, index, values)
+            return result
+        distinct, rows = np.unique(np.asarray(keys)[valid], return_inverse=True)
+        result = np.full((len(distinct), self.count), fill, dtype=dtype)
+        reduce.at(result, (rows, index), values)
+        return distinct.tolist(), result
+
+
+def lttb(x, y, points):
+    """
+    Indices of the `points` samples Largest-Triangle-Three-Buckets picks to draw the line
+    through x and y: the first and last sample and, from each of the equal buckets in
+    between, the one forming the largest triangle with the previously picked sample and
+    the average of the next bucket
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = previous = 0
+    selected[-1] = n - 1
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i == points - 3:
+            next_x, next_y = x[n - 1], y[n - 1]
+        else:
+            next_end = edges[i + 2]
+            next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = selected[i + 1] = start + int(np.argmax(area))
+    return selected
+
+
+def downsample(columns, x, y, points):
+    """
+    Keep the samples LTTB picks on columns x and y in every column
+    """
+    if not points:
+        return columns
+    indices = lttb(columns[x], columns[y], points)
+    return {name: column[indices] for name, column in columns.items()}
+
+
+def to_list(array):
+    """
+    A numpy array as a list of python numbers, NaN becoming None
+    """
+    if np.issubdtype(array.dtype, np.floating):
+        values = array.astype(object)
+        values[np.isnan(array)] = None
+        return values.tolist()
+    return array.tolist()
+
+
+def to_columns(**columns):
+    return {name: to_list(array) for name, array in columns.items()}
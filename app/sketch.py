@@ -0,0 +1,76 @@
+"""
+Mergeable sketch of a latency distribution. Latencies are counted in logarithmic
+buckets so that any quantile read back is within RELATIVE_ACCURACY of the true value,
+however many sketches were merged to produce it. Buckets are stored sparsely as a JSON
+object mapping the bucket index to its count, and sketches are merged by adding the
+counts of matching buckets (see PingMinutelyRollupQuerySet for the SQL equivalent).
+"""
+import math
+from collections import Counter
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+
+def bucket_index(value):
+    if value <= 1:
+        return 0
+    return math.ceil(math.log(value) / LOG_GAMMA)
+
+
+def bucket_value(index):
+    if index == 0:
+        return 1.0
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+class LatencySketch:
+    def __init__(self, buckets=None):
+        # JSON object keys are always strings
+        self.buckets = {int(k): v for k, v in (buckets or {}).items()}
+
+    @classmethod
+    def of(cls, values):
+        sketch = cls()
+        for value in values:
+            sketch.add(value)
+        return sketch
+
+    @classmethod
+    def merged(cls, stored):
+        """
+        One sketch of many stored as JSON, without building each of them
+        """
+        buckets = Counter()
+        for sketch in stored:
+            buckets.update(sketch)
+        return cls(buckets)
+
+    @property
+    def count(self):
+        return sum(self.buckets.values())
+
+    def add(self, value, count=1):
+        index = bucket_index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        return self
+
+    def quantile(self, q):
+        if not self.buckets:
+            return None
+        # nearest rank, the smallest value with at least q of all values at or below it
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return bucket_value(index)
+        return bucket_value(max(self.buckets))
+
+    def to_json(self):
+        return {str(k): v for k, v in self.buckets.items()}
@@ -0,0 +1,164 @@
+"""
+Server-Sent Events stream of completed rounds, mounted at EVENTS_PATH by server/asgi.py.
+
+Each worker process holds one redis subscription in a background thread and fans the
+published events (see app.events) out to its connected clients, so a viewer costs an
+open connection and nothing else. A client reconnecting with Last-Event-ID (or the
+`last_event_id` query parameter) first gets the events it missed from the kept history.
+Clients that fall too far behind are disconnected and catch up the same way.
+"""
+import json
+import time
+import asyncio
+import logging
+import threading
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from redis import RedisError
+from django.conf import settings
+
+from ._utils import get_redis
+from . import events
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PATH = '/events/'
+
+
+class EventBroker:
+    """
+    Relays the redis channel to the asyncio queues of the connected clients
+    """
+    def __init__(self):
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=settings.SSE_QUEUE_SIZE)
+        queue.overflowed = False
+        with self.lock:
+            self.clients.add((asyncio.get_event_loop(), queue))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='sse-broker', daemon=True)
+                self.thread.start()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self.lock:
+            self.clients = {client for client in self.clients if client[1] is not queue}
+
+    def run(self):
+        while True:
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(events.CHANNEL)
+                for message in pubsub.listen():
+                    try:
+                        self.broadcast(json.loads(message['data']))
+                    except ValueError:
+                        logger.warning(f'dropping malformed event {message["data"]!r}')
+            except RedisError:
+                logger.warning('lost the event subscription, reconnecting', exc_info=True)
+                time.sleep(1)
+            except Exception:
+                # the thread is only started once, it must outlive anything going wrong
+                logger.exception('event relay failed, resubscribing')
+                time.sleep(1)
+
+    def broadcast(self, message):
+        with self.lock:
+            clients = list(self.clients)
+        for loop, queue in clients:
+            loop.call_soon_threadsafe(_deliver, queue, message)
+
+
+def _deliver(queue, message):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        queue.overflowed = True
+
+
+broker = EventBroker()
+
+
+def format_event(message):
+    data = json.dumps(message['data'], separators=(',', ':'))
+    return f'id: {message["id"]}\nevent: {message["event"]}\ndata: {data}\n\n'.encode()
+
+
+def get_last_event_id(scope):
+    for name, value in scope['headers']:
+        if name == b'last-event-id':
+            value = value.decode()
+            break
+    else:
+        value = parse_qs(scope['query_string'].decode()).get('last_event_id', [''])[0]
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+async def application(scope, receive, send):
+    if scope['method'] != 'GET':
+        await send({'type': 'http.response.start', 'status': 405,
+                    'headers': [(b'allow', b'GET')]})
+        await send({'type': 'http.response.body'})
+        return
+    last_event_id = get_last_event_id(scope)
+    # subscribe before reading the history so nothing is lost in between
+    queue = broker.subscribe()
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ]
+        })
+        await _send(send, f'retry: {settings.SSE_RETRY}\n\n'.encode())
+        sent_id = last_event_id or 0
+        if last_event_id is not None:
+            try:
+                missed = await sync_to_async(events.get_history, thread_sensitive=False)(last_event_id)
+            except RedisError:
+                logger.warning('unable to read the event history', exc_info=True)
+                missed = []
+            for message in missed:
+                await _send(send, format_event(message))
+                sent_id = message['id']
+        while not queue.overflowed:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                (getter, disconnected), timeout=settings.SSE_KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                getter.cancel()
+                break
+            if getter not in done:
+                getter.cancel()
+                await _send(send, b': keepalive\n\n')
+                continue
+            message = getter.result()
+            if message['id'] > sent_id:
+                await _send(send, format_event(message))
+                sent_id = message['id']
+        await send({'type': 'http.response.body'})
+    finally:
+        broker.unsubscribe(queue)
+        disconnected.cancel()
+
+
+async def _send(send, chunk):
+    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
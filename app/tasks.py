@@ -1,9 +1,15 @@
 import time
+import threading
 import traceback
 from datetime import timedelta
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from celery import shared_task, chord
+from celery.signals import worker_process_init
 from celery.utils.log import get_task_logger
 from requests import exceptions as requests_exceptions
 
@@ -12,14 +18,18 @@ from .models import Service, Blockchain, CheckInstance, ChainHeightResult, Check
     RESULT_STATUS_OK, RESULT_STATUS_WARN, RESULT_STATUS_ERR, CHECK_TYPE_BLOCK_HEIGHT, \
     ERROR_TAG_TIMEOUT, ERROR_TAG_SYSTEM, ERROR_TAG_SSL, ERROR_TAG_ENCODING, ERROR_TAG_HTTP, \
     ERROR_TAG_UNKNOWN, ERROR_TAG_CONNECTION, CHECK_TYPE_PING, PingResult, \
-    BlockValidationInstance, BlockValidationResult
+    BlockValidationInstance, BlockValidationResult, ChainHeightHourlyRollup, PingMinutelyRollup, \
+    LatestChainStatus, ROUND_TIMEOUT_ERROR
+from .registry import get_registry, bump_version as bump_registry_version
+from .ingest import ResultWriter, write_results
+from . import pruning, render_cache, events, metrics
 
 logger = get_task_logger('app.tasks')
 
 
 @shared_task
 def update_all_supported_blockchains():
-    services = Service.objects.all()
+    services = get_registry().get_services()
     for svc in services:
         update_supported_blockchain.apply_async((svc.slug,))
 
@@ -43,49 +53,69 @@ def update_supported_blockchain(service_slug):
             is_testnet=chain.testnet
         )
         blockchain.create_meta_if_not_exists()
+    # the save signals already invalidated the registry, but be explicit about it as the
+    # metadata of existing chains may also have changed
+    bump_registry_version()
 
 
 @shared_task
 def update_all_blockchain_heights():
-    services = Service.objects.all()
-    check = CheckInstance.objects.create(started=timezone.now(), type=CHECK_TYPE_BLOCK_HEIGHT)
+    registry = get_registry()
+    services = registry.get_services()
+    started = timezone.now()
+    check = CheckInstance.objects.create(
+        started=started,
+        type=CHECK_TYPE_BLOCK_HEIGHT,
+        deadline=started + timedelta(seconds=settings.HEIGHT_ROUND_DEADLINE)
+    )
     jobs = []
+    expected = []
     for svc in services:
         runner = get_check_runners().get(svc.slug, None)
         if runner is None:
             continue
-        chains = Blockchain.objects.filter(service=svc, ignore=False).exclude(meta__isnull=True)
+        chains = registry.get_checked_chains(svc.slug)
         if svc.bulk_chain_query and 'height_bulk' in runner.get_supported_checks():
             jobs.append(update_blockchain_heights_bulk.s(svc.slug, [chain.slug for chain in chains], check.pk))
+            expected.extend((svc.slug, chain.slug) for chain in chains)
         elif 'height' in runner.get_supported_checks():
             for chain in chains:
                 jobs.append(update_blockchain_height.s(svc.slug, chain.slug, check.pk))
+                expected.append((svc.slug, chain.slug))
     chord(jobs, complete_check.si(check.pk)).apply_async()
+    expire_check.apply_async((check.pk, expected), eta=check.deadline)
 
 
 @shared_task
 def update_all_pings():
-    check = CheckInstance.objects.create(started=timezone.now(), type=CHECK_TYPE_PING)
-    services = Service.objects.all()
+    started = timezone.now()
+    check = CheckInstance.objects.create(
+        started=started,
+        type=CHECK_TYPE_PING,
+        deadline=started + timedelta(seconds=settings.PING_ROUND_DEADLINE)
+    )
+    services = get_registry().get_services()
     jobs = []
+    expected = []
     for svc in services:
         runner = get_check_runners().get(svc.slug, None)
         if runner is not None and 'ping' in runner.get_supported_checks():
             jobs.append(do_ping.s(svc.slug, check.pk))
+            expected.append(svc.slug)
     chord(jobs, complete_ping_check.si(check.pk)).apply_async()
+    expire_ping_check.apply_async((check.pk, expected), eta=check.deadline)
 
 
 @shared_task
 def validate_all_blockchains():
-    fullnode_service = Service.objects.get(slug='fullnode')
-    supported_chains = Blockchain.objects.filter(service=fullnode_service, ignore=False).exclude(meta__isnull=True)
+    supported_chains = get_registry().get_checked_chains('fullnode')
     for chain in supported_chains:
         update_canonical_chain.apply_async(args=(chain.pk,))
 
 
 @shared_task
 def update_canonical_chain(blockchain_id):
-    chain = Blockchain.objects.get(pk=blockchain_id)
+    chain = get_registry().get_chain_by_pk(blockchain_id)
     # determine most recent result
     most_recent = BlockValidationInstance.objects.filter(
         blockchain=chain, timed_out=False
@@ -126,44 +156,35 @@ def update_canonical_chain(blockchain_id):
         jobs = []
         for i in range(instance.start_height, instance.end_height):
             jobs.append(fetch_canonical_block.s(instance.pk, i))
-        chord(jobs, perform_all_block_validations.si(instance.pk)).apply_async()
+        chord(jobs, perform_all_block_validations.s(instance.pk)).apply_async()
 
 
 @shared_task(bind=True)
 def fetch_canonical_block(task, validation_instance_id, height):
-    instance = BlockValidationInstance.objects.get(pk=validation_instance_id)
+    instance = get_validation_instance(validation_instance_id)
     runner = get_check_runners().get('fullnode')
     resp = run_http_method(runner.get_block_at_height, instance.blockchain.slug, height)
     if resp.error:
         # can not absorb an error for canonical chain fetch failure, just retry
-        print(f'canonical fetch failed at height {height} for instance {instance} failed with {resp.error}')
+        logger.warning(f'canonical fetch failed at height {height} for instance {instance} failed with {resp.error}')
         raise task.retry(max_retries=13)
-    BlockValidationResult.objects.create(
-        blockchain=instance.blockchain,
-        validation_instance=instance,
-        service=instance.blockchain.service,
-        started=resp.started_time,
-        duration=resp.duration,
-        status=resp.status,
-        height=resp.result.height,
-        block_hash=resp.result.hash,
-        transaction_ids=resp.result.txids,
-        is_canonical=True,
-        missing_transaction_ids=[]
-    )
+    return fetched_block(resp)
 
 
 @shared_task
-def perform_all_block_validations(validation_instance_id):
+def perform_all_block_validations(blocks, validation_instance_id):
     """
-    Finalize the BVI for the canonical block, and kick off validations for any services that support it
+    Write the canonical blocks fetched for the BVI, finalize it, and kick off validations
+    for any services that support it
     """
-    instance = BlockValidationInstance.objects.get(pk=validation_instance_id)
-    instance.completed = timezone.now()
-    instance.save()
-
-    services = Service.objects.all()
-    for svc in services:
+    instance = get_validation_instance(validation_instance_id)
+    with transaction.atomic():
+        write_results(block_result(block, instance, is_canonical=True) for block in blocks)
+        instance.completed = timezone.now()
+        instance.save()
+
+    registry = get_registry()
+    for svc in registry.get_services():
         runner = get_check_runners().get(svc.slug, None)
         # ensure the runner supports the check and chain we are looking at
         if runner is None or CHECK_BLOCK_VALIDATION not in runner.get_supported_checks():
@@ -171,7 +192,7 @@ def perform_all_block_validations(validation_instance_id):
         supported_chain_slugs = {c.slug for c in runner.get_supported_chains()}
         if instance.blockchain.slug not in supported_chain_slugs:
             continue
-        chain = Blockchain.objects.get(service=svc, slug=instance.blockchain.slug)
+        chain = registry.get_chain(svc.slug, instance.blockchain.slug)
         # ensure there isn't already a validation instance running
         existing_service_instance = BlockValidationInstance.objects.filter(
             blockchain=chain, timed_out=False, start_height=instance.start_height, end_height=instance.end_height
@@ -187,53 +208,96 @@ def perform_all_block_validations(validation_instance_id):
         )
         jobs = []
         for i in range(service_instance.start_height, service_instance.end_height):
-            canonical_block_result = BlockValidationResult.objects.get(validation_instance=instance, height=i)
-            jobs.append(fetch_service_block.s(service_instance.pk, canonical_block_result.pk, i))
-        chord(jobs, finalize_service_block_validation.si(service_instance.pk)).apply_async()
+            jobs.append(fetch_service_block.s(service_instance.pk, i))
+        chord(jobs, finalize_service_block_validation.s(service_instance.pk, instance.pk)).apply_async()
 
 
 @shared_task(bind=True)
-def fetch_service_block(task, validation_instance_id, canonical_block_id, height):
-    instance = BlockValidationInstance.objects.get(pk=validation_instance_id)
+def fetch_service_block(task, validation_instance_id, height):
+    instance = get_validation_instance(validation_instance_id)
     runner = get_check_runners().get(instance.blockchain.service.slug)
     resp = run_http_method(runner.get_block_at_height, instance.blockchain.slug, height)
     if resp.error:
-        print(f'service fetch failed at height {height} for instance {instance} failed with {resp.error}')
+        logger.warning(f'service fetch failed at height {height} for instance {instance} failed with {resp.error}')
         raise task.retry(max_retries=13)
-    canonical_result = BlockValidationResult.objects.get(pk=canonical_block_id)
-    kwargs = {
-        'blockchain': instance.blockchain,
-        'validation_instance': instance,
-        'service': instance.blockchain.service,
-        'started': resp.started_time,
+    return fetched_block(resp)
+
+
+@shared_task
+def finalize_service_block_validation(blocks, validation_instance_id, canonical_instance_id):
+    """
+    Compare the blocks fetched from the service with the canonical ones, write them and
+    finalize the BVI
+    """
+    instance = get_validation_instance(validation_instance_id)
+    canonical_results = {
+        result.height: result
+        for result in BlockValidationResult.objects.filter(validation_instance_id=canonical_instance_id).only(
+            'height', 'block_hash', 'transaction_ids'
+        )
+    }
+    results = []
+    for block in blocks:
+        canonical_result = canonical_results[block['height']]
+        txids = set(block['transaction_ids'])
+        results.append(block_result(
+            block, instance,
+            canonical_result=canonical_result,
+            hash_mismatch=block['block_hash'] != canonical_result.block_hash,
+            missing_transaction_ids=[
+                txid for txid in canonical_result.transaction_ids if txid not in txids
+            ]
+        ))
+    with transaction.atomic():
+        write_results(results)
+        instance.completed = timezone.now()
+        instance.save()
+    events.publish_validation(instance)
+    metrics.record_validation(instance)
+
+
+def fetched_block(resp):
+    """
+    A fetched block as the result of its fetch task, the chord callback of the window
+    writes the blocks of all heights at once
+    """
+    return {
+        'started': resp.started_time.isoformat(),
         'duration': resp.duration,
         'status': resp.status,
         'height': resp.result.height,
         'block_hash': resp.result.hash,
-        'transaction_ids': resp.result.txids,
-        'canonical_result': canonical_result,
-        'missing_transaction_ids': []
+        'transaction_ids': list(resp.result.txids),
     }
-    if resp.result.hash != canonical_result.block_hash:
-        kwargs['hash_mismatch'] = True
-    for txid in canonical_result.transaction_ids:
-        if txid not in resp.result.txids:
-            kwargs['missing_transaction_ids'].append(txid)
-    BlockValidationResult.objects.create(**kwargs)
 
 
-@shared_task
-def finalize_service_block_validation(validation_instance_id):
+def block_result(block, instance, **kwargs):
+    kwargs.setdefault('missing_transaction_ids', [])
+    return BlockValidationResult(
+        blockchain=instance.blockchain,
+        validation_instance=instance,
+        service=instance.blockchain.service,
+        started=parse_datetime(block['started']),
+        duration=block['duration'],
+        status=block['status'],
+        height=block['height'],
+        block_hash=block['block_hash'],
+        transaction_ids=block['transaction_ids'],
+        **kwargs
+    )
+
+
+def get_validation_instance(validation_instance_id):
     instance = BlockValidationInstance.objects.get(pk=validation_instance_id)
-    instance.completed = timezone.now()
-    instance.save()
+    instance.blockchain = get_registry().get_chain_by_pk(instance.blockchain_id)
+    return instance
 
 
 @shared_task
 def do_ping(service_slug, check_id):
     runner = get_check_runners().get(service_slug)
     result = run_http_method(runner.get_ping)
-    service = Service.objects.get(slug=service_slug)
+    service = get_registry().get_service(service_slug)
     kwargs = {
         'service': service,
         'check_instance_id': check_id,
@@ -241,19 +305,68 @@ def do_ping(service_slug, check_id):
         'duration': result.duration,
         'status': result.status,
     }
-    if result.error:
-        result.error.service = service
-        result.error.check_instance_id = check_id
-        result.error.save()
-        kwargs['error_details'] = result.error
-    PingResult.objects.create(**kwargs)
+    with transaction.atomic():
+        if not CheckInstance.objects.lock_if_open(check_id):
+            logger.info(f'dropping late ping from {service_slug} for check {check_id}')
+            return
+        if result.error:
+            result.error.service = service
+            result.error.check_instance_id = check_id
+            CheckError.objects.record(result.error)
+            kwargs['error_details'] = result.error
+        ping = PingResult.objects.create(**kwargs)
+        PingMinutelyRollup.objects.add_pings([ping])
 
 
 @shared_task
 def complete_ping_check(check_id):
-    check = CheckInstance.objects.get(pk=check_id)
-    check.completed = timezone.now()
-    check.save()
+    finalize_ping_check(check_id)
+
+
+@shared_task
+def expire_ping_check(check_id, expected_service_slugs):
+    finalize_ping_check(check_id, expected_service_slugs)
+
+
+def finalize_ping_check(check_id, expected_service_slugs=None):
+    """
+    Complete a ping round. When called with the expected services because the round
+    deadline passed, any service that has not reported yet is recorded as timed out
+    """
+    timed_out = expected_service_slugs is not None
+    with transaction.atomic():
+        if not CheckInstance.objects.mark_completed(check_id, timed_out=timed_out):
+            return
+        check = CheckInstance.objects.get(pk=check_id)
+        transaction.on_commit(lambda: events.publish_ping_check(check))
+        transaction.on_commit(lambda: metrics.record_ping_check(check))
+        if not timed_out:
+            return
+        reported = set(PingResult.objects.filter(check_instance=check).values_list(
+            'service__slug', flat=True))
+        missing = [slug for slug in expected_service_slugs if slug not in reported]
+        pings = []
+        for slug in missing:
+            try:
+                service = get_registry().get_service(slug)
+            except Service.DoesNotExist:
+                logger.warning(f'service {slug} of check {check_id} no longer exists, skipping its ping')
+                continue
+            logger.info(f'ping from {service.slug} timed out for check {check_id}')
+            pings.append(PingResult(
+                service=service,
+                check_instance=check,
+                started=check.started,
+                duration=deadline_duration(check),
+                status=RESULT_STATUS_ERR,
+                error_details=CheckError.objects.record(CheckError(
+                    check_instance=check,
+                    service=service,
+                    error_message=ROUND_TIMEOUT_ERROR,
+                    tag=ERROR_TAG_TIMEOUT
+                ))
+            ))
+        PingMinutelyRollup.objects.add_pings(write_results(pings), timed_out=True)
 
 
 @shared_task
@@ -263,36 +376,45 @@ def update_blockchain_heights_bulk(service_slug, chain_ids, check_id):
     all_heights = results.result
     if all_heights is None:
         all_heights = [None for _ in chain_ids]
-    service = Service.objects.get(slug=service_slug)
-    if results.error is not None:
-        all_blockchain, _ = Blockchain.objects.get_or_create(
-            name='ALL',
-            service=service,
-            slug=service_slug + '-all',
-        )
-        results.error.check_instance_id = check_id
-        results.error.blockchain = all_blockchain
-        results.error.save()
-    for chain_id, chain_height in zip(chain_ids, all_heights):
-        kwargs = {
-            'blockchain': Blockchain.objects.get(service__slug=service_slug, slug=chain_id),
-            'check_instance_id': check_id,
-            'started': results.started_time,
-            'duration': results.duration / int(len(chain_ids) * .8),
-            'status': results.status
-        }
-        if chain_height is not None:
-            kwargs['height'] = chain_height.height
+    service = get_registry().get_service(service_slug)
+    with transaction.atomic():
+        if not CheckInstance.objects.lock_if_open(check_id):
+            logger.info(f'dropping late bulk heights from {service_slug} for check {check_id}')
+            return
         if results.error is not None:
-            kwargs['error'] = results.error.error_message
-            kwargs['error_details'] = results.error
-        ChainHeightResult.objects.create(**kwargs)
+            try:
+                all_blockchain = get_registry().get_chain(service_slug, service_slug + '-all')
+            except Blockchain.DoesNotExist:
+                all_blockchain, _ = Blockchain.objects.get_or_create(
+                    name='ALL',
+                    service=service,
+                    slug=service_slug + '-all',
+                )
+            results.error.check_instance_id = check_id
+            results.error.blockchain = all_blockchain
+            CheckError.objects.record(results.error)
+        writer = ResultWriter(ChainHeightResult)
+        for chain_id, chain_height in zip(chain_ids, all_heights):
+            kwargs = {
+                'blockchain': get_registry().get_chain(service_slug, chain_id),
+                'check_instance_id': check_id,
+                'started': results.started_time,
+                'duration': results.duration / int(len(chain_ids) * .8),
+                'status': results.status
+            }
+            if chain_height is not None:
+                kwargs['height'] = chain_height.height
+            if results.error is not None:
+                kwargs['error'] = results.error.error_message
+                kwargs['error_details'] = results.error
+            writer.add(ChainHeightResult(**kwargs))
+        writer.flush()
 
 
 @shared_task
 def update_blockchain_height(service_slug, chain_id, check_id):
     runner = get_check_runners().get(service_slug)
-    blockchain = Blockchain.objects.get(service__slug=service_slug, slug=chain_id)
+    blockchain = get_registry().get_chain(service_slug, chain_id)
     result = run_http_method(runner.get_block_height, chain_id)
     kwargs = {
         'blockchain': blockchain,
@@ -303,42 +425,115 @@ def update_blockchain_height(service_slug, chain_id, check_id):
     }
     if result.result is not None:
         kwargs['height'] = result.result.height
-    if result.error is not None:
-        result.error.blockchain = blockchain
-        result.error.check_instance_id = check_id
-        result.error.save()
-        kwargs['error'] = result.error.error_message
-        kwargs['error_details'] = result.error
-    ChainHeightResult.objects.create(**kwargs)
+    with transaction.atomic():
+        if not CheckInstance.objects.lock_if_open(check_id):
+            logger.info(f'dropping late height of {chain_id} from {service_slug} for check {check_id}')
+            return
+        if result.error is not None:
+            result.error.blockchain = blockchain
+            result.error.check_instance_id = check_id
+            CheckError.objects.record(result.error)
+            kwargs['error'] = result.error.error_message
+            kwargs['error_details'] = result.error
+        ChainHeightResult.objects.create(**kwargs)
 
 
 @shared_task
 def prune_old_results():
-    return CheckInstance.objects.delete_expired()
+    return pruning.prune()
 
 
 @shared_task
 def complete_check(check_id):
-    check = CheckInstance.objects.get(pk=check_id)
-    check.completed = timezone.now()
-    check.save()
-
-    results = ChainHeightResult.objects.filter(check_instance=check).select_related('blockchain')
-    best = {}
-
-    # calculate the best height for each blockchain id
-    for result in results:
-        if result.blockchain.slug in best:
-            current_best = best[result.blockchain.slug]
-            if result.height > current_best.height:
+    finalize_height_check(check_id)
+
+
+@shared_task
+def expire_check(check_id, expected_chains):
+    finalize_height_check(check_id, expected_chains)
+
+
+def finalize_height_check(check_id, expected_chains=None):
+    """
+    Complete a height round and link every result to the best result for its chain. When
+    called with the expected (service slug, chain slug) pairs because the round deadline
+    passed, any pair that has not reported yet is recorded as timed out
+    """
+    timed_out = expected_chains is not None
+    with transaction.atomic():
+        if not CheckInstance.objects.mark_completed(check_id, timed_out=timed_out):
+            return
+        check = CheckInstance.objects.get(pk=check_id)
+        if timed_out:
+            record_missing_heights(check, expected_chains)
+
+        results = list(ChainHeightResult.objects.filter(check_instance=check))
+        registry = get_registry()
+        for result in results:
+            result.blockchain = registry.get_chain_by_pk(result.blockchain_id)
+        best = {}
+
+        # calculate the best height for each blockchain id
+        for result in results:
+            if result.blockchain.slug in best:
+                current_best = best[result.blockchain.slug]
+                if result.height > current_best.height:
+                    best[result.blockchain.slug] = result
+            else:
                 best[result.blockchain.slug] = result
-        else:
-            best[result.blockchain.slug] = result
 
-    # save the difference from best height in each result
-    for result in results:
-        result.best_result = best[result.blockchain.slug]
-        result.save()
+        # save the difference from best height in each result
+        for result in results:
+            result.set_best_result(best[result.blockchain.slug])
+        ChainHeightResult.objects.bulk_update(
+            results, ['best_result', 'best_height', 'best_service_slug', 'lag', 'lag_status']
+        )
+
+        ChainHeightHourlyRollup.objects.add_results(results)
+        LatestChainStatus.objects.refresh(check_id)
+        transaction.on_commit(render_cache.warm)
+        transaction.on_commit(lambda: events.publish_height_check(check_id))
+        transaction.on_commit(lambda: metrics.record_height_check(check_id))
+
+
+def record_missing_heights(check, expected_chains):
+    registry = get_registry()
+    reported = {
+        (chain.service.slug, chain.slug) for chain in map(
+            registry.get_chain_by_pk,
+            ChainHeightResult.objects.filter(check_instance=check).values_list('blockchain_id', flat=True)
+        )
+    }
+    missing = {tuple(pair) for pair in expected_chains} - reported
+    writer = ResultWriter(ChainHeightResult)
+    for service_slug, chain_slug in sorted(missing):
+        try:
+            chain = registry.get_chain(service_slug, chain_slug)
+        except Blockchain.DoesNotExist:
+            logger.warning(f'chain {chain_slug} of {service_slug} no longer exists, skipping its '
+                           f'height for check {check.pk}')
+            continue
+        logger.info(f'height of {chain.slug} from {chain.service.slug} timed out for check {check.pk}')
+        error = CheckError.objects.record(CheckError(
+            check_instance=check,
+            blockchain=chain,
+            error_message=ROUND_TIMEOUT_ERROR,
+            tag=ERROR_TAG_TIMEOUT
+        ))
+        writer.add(ChainHeightResult(
+            blockchain=chain,
+            check_instance=check,
+            started=check.started,
+            duration=deadline_duration(check),
+            status=RESULT_STATUS_ERR,
+            error=error.error_message,
+            error_details=error
+        ))
+    writer.flush()
+
+
+def deadline_duration(check):
+    return int((check.deadline - check.started).total_seconds() * 1000)
 
 
 HttpMethodResult = namedtuple('HttpMethodResult', (
@@ -411,3 +606,33 @@ def get_check_runners():
     if check_runners is None:
         check_runners = get_all_check_runners()
     return check_runners
+
+
+def warm_up_connections(runners):
+    started = time.monotonic()
+    deadline = started + settings.WORKER_WARM_UP_DEADLINE
+    with ThreadPoolExecutor(max_workers=len(runners)) as executor:
+        list(executor.map(lambda runner: runner.warm_up(deadline), runners.values()))
+    logger.info(f'worker connections warmed up in {(time.monotonic() - started) * 1000:.0f}ms')
+
+
+@worker_process_init.connect
+def warm_up_worker(**kwargs):
+    """
+    Build the check runners and load the registry before the worker process accepts its
+    first task, connections to the checked hosts are opened in the background: the pool
+    gives a new process only a few seconds to report that it is up
+    """
+    started_ns = time.time_ns()
+    runners = get_check_runners()
+    runners_ns = time.time_ns()
+    get_registry()
+    registry_ns = time.time_ns()
+    logger.info(
+        f'worker warm-up took {(registry_ns - started_ns) / 1_000_000:.0f}ms '
+        f'(runners {(runners_ns - started_ns) / 1_000_000:.0f}ms, '
+        f'registry {(registry_ns - runners_ns) / 1_000_000:.0f}ms)'
+    )
+    if runners:
+        threading.Thread(target=warm_up_connections, args=(runners,), daemon=True,
+                         name='warm-up').start()
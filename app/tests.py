@@ -1,3 +1,144 @@
-from django.test import TestCase
+import math
+import random
+import datetime
+from collections import defaultdict
+import numpy as np
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .series import Buckets, lttb, to_list, to_columns
+
+
+def loop_lttb(x, y, points):
+    """
+    Largest-Triangle-Three-Buckets as a plain loop, the reference for `lttb`
+    """
+    n = len(x)
+    every = (n - 2) / (points - 2)
+    a = 0
+    selected = [0]
+    for i in range(points - 2):
+        avg_start = math.floor((i + 1) * every) + 1
+        avg_end = min(math.floor((i + 2) * every) + 1, n)
+        avg_x = sum(x[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(y[avg_start:avg_end]) / (avg_end - avg_start)
+        max_area = -1
+        for j in range(math.floor(i * every) + 1, math.floor((i + 1) * every) + 1):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > max_area:
+                max_area = area
+                next_a = j
+        selected.append(next_a)
+        a = next_a
+    selected.append(n - 1)
+    return selected
+
+
+class BucketsTest(SimpleTestCase):
+    def setUp(self):
+        self.random = random.Random(42)
+        end = datetime.datetime(2021, 1, 1, 5, 30, tzinfo=datetime.timezone.utc)
+        self.buckets = Buckets.ending_at(end, datetime.timedelta(hours=1), datetime.timedelta(days=7))
+        self.hours = [self.buckets.start_datetime + datetime.timedelta(hours=i)
+                      for i in range(self.buckets.count)]
+
+    def rows(self, count):
+        # hours within the buckets and some outside, several rows per hour
+        return [
+            (self.buckets.start + self.random.randint(-24, self.buckets.count + 24) * 3600
+             + self.random.randint(0, 3599), self.random.randint(0, 100), self.random.choice('abc'))
+            for _ in range(count)
+        ]
+
+    def test_ending_at(self):
+        self.assertEqual(self.buckets.count, 7 * 24 + 1)
+        self.assertEqual(self.hours[-1], datetime.datetime(2021, 1, 1, 5, tzinfo=datetime.timezone.utc))
+        self.assertEqual(self.buckets.end_datetime, self.hours[-1] + datetime.timedelta(hours=1))
+
+    def test_labels(self):
+        self.assertEqual(self.buckets.labels(), [hour.strftime('%y-%m-%d %H:%M') for hour in self.hours])
+        self.assertEqual(Buckets(0, 60, 0).labels(), [])
+
+    def test_dense_matches_loop(self):
+        rows = self.rows(2000)
+        # the way the charts were filled before: totals keyed by label, then a value per label
+        totals = defaultdict(int)
+        for time, value, _ in rows:
+            hour = datetime.datetime.fromtimestamp(time, datetime.timezone.utc).replace(minute=0, second=0)
+            totals[hour.strftime('%y-%m-%d %H:00')] += value
+        expected = [totals.get(hour.strftime('%y-%m-%d %H:00'), 0) for hour in self.hours]
+
+        times, values, _ = zip(*rows)
+        dense = self.buckets.dense(times, values, dtype=np.int64)
+        self.assertEqual(dense.tolist(), expected)
+
+    def test_dense_by_key_matches_loop(self):
+        rows = self.rows(2000)
+        expected = defaultdict(lambda: [0] * self.buckets.count)
+        for time, value, key in rows:
+            i = (time - self.buckets.start) // 3600
+            if 0 <= i < self.buckets.count:
+                expected[key][i] += value
+
+        times, values, keys = zip(*rows)
+        distinct, dense = self.buckets.dense(times, values, keys=keys, dtype=np.int64)
+        self.assertEqual(distinct, sorted(expected))
+        self.assertEqual({key: row for key, row in zip(distinct, dense.tolist())}, dict(expected))
+
+    def test_dense_minimum(self):
+        rows = self.rows(500)
+        expected = [None] * self.buckets.count
+        for time, value, _ in rows:
+            i = (time - self.buckets.start) // 3600
+            if 0 <= i < self.buckets.count:
+                expected[i] = value if expected[i] is None else min(expected[i], value)
+
+        times, values, _ = zip(*rows)
+        # the fill is where minimum starts from, periods without values keep it
+        no_min = np.iinfo(np.int64).max
+        dense = self.buckets.dense(times, values, fill=no_min, reduce=np.minimum, dtype=np.int64)
+        self.assertEqual(dense.tolist(), [no_min if value is None else value for value in expected])
+
+    def test_dense_empty(self):
+        self.assertEqual(self.buckets.dense([], []).tolist(), [0.0] * self.buckets.count)
+
+
+class ColumnsTest(SimpleTestCase):
+    def test_to_list_nan_is_none(self):
+        self.assertEqual(to_list(np.array([1.5, np.nan, 0.0, np.nan])), [1.5, None, 0.0, None])
+
+    def test_to_list_integers(self):
+        values = to_list(np.array([1, 2, 3], dtype=np.int64))
+        self.assertEqual(values, [1, 2, 3])
+        self.assertTrue(all(type(value) is int for value in values))
+
+    def test_to_columns(self):
+        self.assertEqual(
+            to_columns(avg=np.array([np.nan, 2.0]), count=np.array([0, 3])),
+            {'avg': [None, 2.0], 'count': [0, 3]}
+        )
+
+
+class LttbTest(SimpleTestCase):
+    def test_matches_loop(self):
+        rng = random.Random(7)
+        for n, points in ((10, 3), (100, 10), (1000, 37), (10081, 1000), (169, 168)):
+            x = list(range(0, n * 60, 60))
+            y = [rng.gauss(100, 30) for _ in range(n)]
+            self.assertEqual(lttb(x, y, points).tolist(), loop_lttb(x, y, points), (n, points))
+
+    def test_keeps_ends_and_peaks(self):
+        y = [0.0] * 1000
+        y[500] = 100.0
+        selected = lttb(list(range(1000)), y, 20).tolist()
+        self.assertEqual((selected[0], selected[-1]), (0, 999))
+        self.assertIn(500, selected)
+        self.assertEqual(selected, sorted(selected))
+
+    def test_short_series_kept(self):
+        self.assertEqual(lttb([1, 2, 3], [1, 2, 3], 5).tolist(), [0, 1, 2])
+        self.assertEqual(lttb([1, 2, 3, 4], [1, 2, 3, 4], 2).tolist(), [0, 1, 2, 3])
+
+    def test_nan_treated_as_zero(self):
+        y = [1.0, float('nan'), 5.0, float('nan'), 2.0, 3.0]
+        self.assertEqual(lttb(list(range(6)), y, 4).tolist(),
+                         loop_lttb(list(range(6)), [0.0 if math.isnan(v) else v for v in y], 4))
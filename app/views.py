@@ -1,46 +1,151 @@
+import logging
+import math
+import datetime
+from calendar import timegm
+from itertools import groupby
+from operator import attrgetter
 from collections import defaultdict
-from django.db.models import OuterRef, Exists
+from redis import RedisError
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, Http404
 from django.core.paginator import Paginator
-from .models import Service, CheckInstance, ChainHeightResult, CheckError, Blockchain, \
-    CHECK_TYPE_BLOCK_HEIGHT, PingResult, BlockValidationResult
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from .models import Service, CheckInstance, ChainHeightResult, CheckError, \
+    CHECK_TYPE_BLOCK_HEIGHT, BlockValidationResult, ChainHeightHourlyRollup, PingMinutelyRollup, \
+    ErrorHourlyRollup, LatestChainStatus, BlockValidationInstance
+from .registry import get_registry, get_version as get_registry_version
+from .routers import replica_reads
+from .sse import EVENTS_PATH
+from .offload import async_view
+from . import render_cache, history, metrics
 
+logger = logging.getLogger(__name__)
 
+# lowest validated heights shown per chain in the validtable
+VALIDTABLE_HEIGHTS = 60
+
+
+# The polled endpoints answer conditional requests: the ETag and Last-Modified come from
+# the latest completed height check (json_summary), the check the cached difftable shows
+# or the latest completed block validation (validtable), and an unchanged poll gets an empty
+# 304 Not Modified. Cache-Control: no-cache lets clients and proxies keep the body but
+# makes them revalidate on every poll.
+
+def _latest_check(request):
+    if not hasattr(request, '_latest_check'):
+        request._latest_check = LatestChainStatus.objects.latest_check()
+    return request._latest_check
+
+
+def check_etag(check_id):
+    # pages also show service and chain details, which bump the registry version
+    return f'check-{check_id}-{get_registry_version(default=0)}'
+
+
+def latest_check_etag(request):
+    latest = _latest_check(request)
+    return check_etag(latest[0]) if latest else None
+
+
+def latest_check_modified(request):
+    latest = _latest_check(request)
+    return latest[1] if latest else None
+
+
+def _latest_validation(request):
+    if not hasattr(request, '_latest_validation'):
+        request._latest_validation = BlockValidationInstance.objects.latest_completed()
+    return request._latest_validation
+
+
+def latest_validation_etag(request):
+    latest = _latest_validation(request)
+    return f'validation-{latest[0]}' if latest else None
+
+
+def latest_validation_modified(request):
+    latest = _latest_validation(request)
+    return latest[1] if latest else None
+
+
+check_condition = condition(etag_func=latest_check_etag, last_modified_func=latest_check_modified)
+validation_condition = condition(etag_func=latest_validation_etag,
+                                 last_modified_func=latest_validation_modified)
+
+
+def conditional_response(request, response, etag, last_modified):
+    """
+    `condition` for a response that is already built, an empty 304 when it is unchanged
+    """
+    etag = quote_etag(etag)
+    response['ETag'] = etag
+    timestamp = None
+    if last_modified is not None:
+        timestamp = timegm(last_modified.utctimetuple())
+        response['Last-Modified'] = http_date(timestamp)
+    return get_conditional_response(request, etag=etag, last_modified=timestamp,
+                                    response=response)
+
+
+@async_view
+@replica_reads()
 def index(request):
-    context = {}
-    context.update(get_difftable_context(request))
-    return render(request, 'app/index.html', context)
+    return HttpResponse(render_cache.get_page('index')[0])
 
 
+@async_view
+@replica_reads()
+@cache_control(no_cache=True)
 def difftable_partial(request):
-    context = get_difftable_context(request)
-    return render(request, 'app/difftable.html', context)
+    # validated against the check the served page shows, which lags behind the latest
+    # check until the pages of a new check are rendered
+    page, check_id = render_cache.get_page('difftable')
+    if check_id is None:
+        return HttpResponse(page)
+    completed = CheckInstance.objects.filter(pk=check_id).values_list(
+        'completed', flat=True).first()
+    return conditional_response(request, HttpResponse(page), check_etag(check_id), completed)
 
 
+@async_view
+@replica_reads()
+@cache_control(no_cache=True)
+@validation_condition
 def validtable_partial(request):
-    context = get_validtable_context(request)
-    return render(request, 'app/validtable.html', context)
+    latest = _latest_validation(request)
+    return HttpResponse(render_cache.get_validtable(latest[0] if latest else None))
 
 
+@async_view
+@replica_reads()
 def service_detail(request, service_slug):
     service = get_object_or_404(Service, slug=service_slug)
     errors = CheckError.objects.for_service(service).select_related(
         'blockchain').order_by('-pk')
     errors_paginator = Paginator(errors, 10)
     errors_page = request.GET.get('error_page', None)
+    points = get_chart_points(request)
     context = {
         'service': service,
         'errors_page': errors_paginator.get_page(errors_page),
-        'error_counts': CheckError.objects.for_service(service).get_error_counts(),
-        'ping_ticks': PingResult.objects.filter(service=service).get_minutely_stats()
+        'error_counts': ErrorHourlyRollup.objects.filter(service=service).get_error_counts(),
+        'ping_ticks': PingMinutelyRollup.objects.filter(service=service).get_minutely_stats(
+            points=points
+        ),
+        'chart_points': points
     }
     recent_checks = CheckInstance.objects.filter(
         type__exact=CHECK_TYPE_BLOCK_HEIGHT
     ).exclude(completed__isnull=True).order_by('-completed')
     if recent_checks.count() > 0:
         latest_check = recent_checks.first()
-        chain_info = ChainHeightResult.objects.for_service(service).get_hourly_stats()
+        chain_info = ChainHeightHourlyRollup.objects.for_service(service).get_hourly_stats(
+            points=points
+        )
         context['latest_check'] = latest_check
         latest_check_results = ChainHeightResult.objects.for_service(
             service, check_instance=latest_check
@@ -58,8 +163,48 @@ def service_detail(request, service_slug):
     return render(request, 'app/service_detail.html', context)
 
 
+@async_view
+@replica_reads()
+def service_series(request, service_slug, name):
+    """
+    A chart series of a service between two times (epoch seconds), downsampled to the
+    requested number of points, for zooming into the charts of the service page
+    """
+    service = get_object_or_404(Service, slug=service_slug)
+    try:
+        start = int(request.GET['start'])
+        end = int(request.GET['end'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'start and end must be epoch seconds'}, status=400)
+    if not start < end:
+        return JsonResponse({'error': 'start must be before end'}, status=400)
+    if end - start > settings.CHART_MAX_RANGE_DAYS * 86400:
+        return JsonResponse(
+            {'error': f'at most {settings.CHART_MAX_RANGE_DAYS} days can be requested'}, status=400
+        )
+    end = datetime.datetime.fromtimestamp(end, datetime.timezone.utc)
+    distance = end - datetime.datetime.fromtimestamp(start, datetime.timezone.utc)
+    points = get_chart_points(request)
+    if name == 'pings':
+        # longer ranges are merged into longer periods so no more than CHART_MAX_PERIODS
+        # are built, each with its sketch
+        minutes = math.ceil(distance / datetime.timedelta(minutes=settings.CHART_MAX_PERIODS))
+        series = PingMinutelyRollup.objects.filter(service=service).get_minutely_stats(
+            distance, datetime.timedelta(minutes=max(1, minutes)), end=end, points=points
+        )
+    elif name == 'heights':
+        series = ChainHeightHourlyRollup.objects.for_service(service).get_hourly_stats(
+            distance, end=end, points=points
+        )
+    else:
+        raise Http404(f'no {name} series')
+    return JsonResponse(series)
+
+
+@async_view
+@replica_reads()
 def error_detail(request, error_id):
-    error = get_object_or_404(CheckError, pk=error_id)
+    error = get_object_or_404(CheckError.objects.select_related('payload_blob'), pk=error_id)
     context = {
         'error': error,
         'height_results': ChainHeightResult.objects.filter(error_details=error)
@@ -67,36 +212,67 @@ def error_detail(request, error_id):
     return render(request, 'app/error_detail.html', context)
 
 
+@async_view
+@replica_reads()
+@cache_control(no_cache=True)
+@check_condition
 def json_summary(request):
-    raw_objects = defaultdict(lambda: defaultdict(dict))
-    check, height_results = get_check_and_results(request)
-    if height_results is not None:
-        for result in height_results:
-            raw_objects[result.blockchain.slug][result.blockchain.service.slug] = result
-
     serialized_objects = defaultdict(lambda: defaultdict(dict))
-    for chain_id, services in raw_objects.items():
-        for service_id, height_result in services.items():
-            serialized_objects[chain_id][service_id] = {
-                'service': height_result.service_slug(),
-                'blockchain': height_result.blockchain_slug(),
-                'difference_from_best': height_result.difference_from_best(),
-                'difference_from_best_status': height_result.difference_from_best_status(),
-                'duration_ms': height_result.duration_ms(),
-                'best_service': height_result.best_service(),
-                'height': height_result.height,
-                'status': height_result.get_status_display(),
-                'error': height_result.error
-            }
+    check, statuses = get_check_and_statuses(request)
+    for status in statuses:
+        serialized_objects[status.chain_slug][status.service_slug] = {
+            'service': status.service_slug,
+            'blockchain': status.chain_slug,
+            'difference_from_best': status.difference_from_best(),
+            'difference_from_best_status': status.difference_from_best_status(),
+            'duration_ms': status.duration_ms(),
+            'best_service': status.best_service_slug or 'unknown',
+            'height': status.height,
+            'status': status.get_status_display(),
+            'error': status.error
+        }
     ret = {
-        'check_id': check.pk,
-        'check_started': check.started,
-        'check_completed': check.completed,
+        'check_id': check.pk if check else None,
+        'check_started': check.started if check else None,
+        'check_completed': check.completed if check else None,
         'chains': serialized_objects
     }
     return JsonResponse(ret)
 
 
+@async_view
+@replica_reads()
+def history_api(request, kind):
+    if kind not in history.HISTORIES:
+        raise Http404(f'no history of {kind}')
+    try:
+        results, next_cursor = history.get_page(kind, request.GET)
+    except history.HistoryError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'results': results, 'next': next_cursor})
+
+
+@async_view
+def prometheus_metrics(request):
+    try:
+        body = metrics.render()
+    except RedisError:
+        logger.warning('unable to read the metrics snapshot', exc_info=True)
+        return HttpResponse('metrics unavailable\n', status=503, content_type='text/plain')
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def get_chart_points(request):
+    """
+    Number of points the client wants per chart series, within CHART_MAX_POINTS
+    """
+    try:
+        points = int(request.GET.get('points', settings.CHART_POINTS))
+    except ValueError:
+        points = settings.CHART_POINTS
+    return max(3, min(points, settings.CHART_MAX_POINTS))
+
+
 def get_difftable_context(request):
     context = {
         'results_by_service_by_chain': {},
@@ -104,24 +280,26 @@ def get_difftable_context(request):
         'chains': [],
         'services': [],
         'chain_metas': {},
-        'check': None
+        'check': None,
+        'events_path': EVENTS_PATH
     }
-    check, height_results = get_check_and_results(request)
-    if height_results is not None:
+    check, statuses = get_check_and_statuses(request)
+    if check is not None:
         context['check'] = check
+        registry = get_registry()
         all_heights = defaultdict(list)
         chain_set = set()
         service_set = set()
-        for result in height_results:
-            context['chain_metas'][
-                result.blockchain.meta.chain_slug] = result.blockchain.meta
-            if result.difference_from_best() == 0:
-                context['chain_heights'][result.blockchain.slug] = result.height
-            all_heights[result.blockchain.slug].append(result.height)
-            key = result.blockchain.service.slug + result.blockchain.slug
-            context['results_by_service_by_chain'][key] = result
-            chain_set.add(result.blockchain.slug)
-            service_set.add(result.blockchain.service.slug)
+        for status in statuses:
+            meta = registry.get_chain_by_pk(status.blockchain_id).meta
+            context['chain_metas'][meta.chain_slug] = meta
+            if status.difference_from_best() == 0:
+                context['chain_heights'][status.chain_slug] = status.height
+            all_heights[status.chain_slug].append(status.height)
+            key = status.service_slug + status.chain_slug
+            context['results_by_service_by_chain'][key] = status
+            chain_set.add(status.chain_slug)
+            service_set.add(status.service_slug)
         chains_to_ignore = set()
         for chain_id in chain_set:
             if sum(all_heights[chain_id]) == 0:
@@ -135,19 +313,17 @@ def get_difftable_context(request):
 
 def get_validtable_context(request):
     context = {}
-    chains = Blockchain.objects.filter(
-        Exists(BlockValidationResult.objects.filter(blockchain=OuterRef('pk'))), service__private=False
-    ).select_related(
-        'service', 'meta'
-    )
+    registry = get_registry()
     services = defaultdict(dict)
-    for chain in chains:
+    blocks = BlockValidationResult.objects.first_blocks(VALIDTABLE_HEIGHTS)
+    for chain_id, heights in groupby(blocks, key=attrgetter('blockchain_id')):
+        chain = registry.get_chain_by_pk(chain_id)
         service = services[chain.service.slug]
         service.setdefault('service', chain.service)
         service.setdefault('chains', [])
         service['chains'].append({
             'chain': chain,
-            'heights': list(chain.validation_results.filter().order_by('height')[:60])
+            'heights': list(heights)
         })
     for svc_ctx in services.values():
         svc_ctx['chains'].sort(key=lambda c: c['chain'].slug)
@@ -155,18 +331,9 @@ def get_validtable_context(request):
     return context
 
 
-def get_check_and_results(request):
-    check, results = (None, None)
-    check_instances = CheckInstance.objects.filter(
-        type__exact=CHECK_TYPE_BLOCK_HEIGHT,
-    ).exclude(completed__isnull=True).order_by('-completed')
-    if check_instances.count() > 0:
-        check = check_instances.first()
-        results = ChainHeightResult.objects.filter(
-            check_instance=check,
-            blockchain__service__private=False
-        ).exclude(blockchain__meta__isnull=True).select_related(
-            'blockchain', 'blockchain__service', 'blockchain__meta',
-            'best_result__blockchain', 'best_result__blockchain__service'
-        )
-    return check, results
+def get_check_and_statuses(request):
+    statuses = list(LatestChainStatus.objects.public())
+    if not statuses:
+        return None, statuses
+    latest = max(statuses, key=lambda status: status.check_completed)
+    return latest.get_check(), statuses
@@ -2,6 +2,8 @@
 ASGI config for server project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests for the live event stream are answered by app.sse without going through
+Django's request handling, everything else is passed on to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
@@ -13,4 +15,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from app import sse  # noqa: E402 needs the apps loaded by get_asgi_application
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == sse.EVENTS_PATH:
+        await sse.application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
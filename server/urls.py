@@ -13,18 +13,25 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from app import views
-import debug_toolbar
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('service/<slug:service_slug>/', views.service_detail, name='service_detail'),
+    path('service/<slug:service_slug>/series/<slug:name>/', views.service_series,
+         name='service_series'),
     path('error/<int:error_id>/', views.error_detail, name='error_detail'),
     path('difftable/', views.difftable_partial, name='difftable'),
     path('validtable/', views.validtable_partial, name='validtable'),
     path('json_summary/', views.json_summary, name='json_summary'),
+    path('history/<slug:kind>/', views.history_api, name='history'),
+    path('metrics', views.prometheus_metrics, name='metrics'),
     path('admin/', admin.site.urls),
-    path('__debug__/', include(debug_toolbar.urls)),
 ]
+
+if settings.DEBUG:
+    import debug_toolbar
+    urlpatterns.append(path('__debug__/', include(debug_toolbar.urls)))